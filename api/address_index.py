@@ -0,0 +1,365 @@
+import os
+import re
+import math
+import time
+import atexit
+import hashlib
+import threading
+import numpy as np
+from api.shared_state import FileLock
+
+ADDRESS_PATTERN = re.compile(r'^0x[0-9a-fA-F]{40}$')
+
+# Verdict codes stored in the index
+CLEAN = 1
+FLAGGED = 2
+VERDICT_NAMES = {CLEAN: "clean", FLAGGED: "flagged"}
+
+# Where a verdict came from
+SOURCE_CHECK = 0
+SOURCE_BLOCKLIST = 1
+
+# Upstream statuses that mean an address should be treated as risky, or as safe; anything else decides nothing
+FLAGGED_STATUSES = {"flagged", "malicious", "high_risk", "blocked", "blacklisted", "sanctioned", "suspicious"}
+CLEAN_STATUSES = {"clean", "safe", "low_risk", "benign", "ok"}
+
+VERDICT_DTYPE = np.dtype([('key', 'S20'), ('verdict', 'u1'), ('source', 'u1'), ('risk_score', 'f4'), ('checked_at', 'f8')])
+
+
+# Function to turn a 0x-prefixed hex address into its 20-byte key, or None if it is malformed
+def address_key(address):
+    if not isinstance(address, str):
+        return None
+    address = address.strip()
+    if not ADDRESS_PATTERN.match(address):
+        return None
+    return bytes.fromhex(address[2:])
+
+
+# Function to reduce an upstream checkaddress response to a verdict and risk score; the verdict is None when
+# the response does not say either way, so an unfamiliar payload is never remembered as clean
+def verdict_from_result(result):
+    risk_score = result.get('risk_score', result.get('riskScore', float('nan')))
+    try:
+        risk_score = float(risk_score)
+    except (TypeError, ValueError):
+        risk_score = float('nan')
+
+    for field in ('flagged', 'is_flagged', 'malicious', 'is_malicious'):
+        if isinstance(result.get(field), bool):
+            return (FLAGGED if result[field] else CLEAN), risk_score
+    status = str(result.get('status', result.get('risk', ''))).lower()
+    if status in FLAGGED_STATUSES:
+        return FLAGGED, risk_score
+    if status in CLEAN_STATUSES:
+        return CLEAN, risk_score
+    return None, risk_score
+
+
+class BloomFilter:
+    """
+    Bit-array Bloom filter over 20-byte address keys using double hashing of a blake2b digest.
+    """
+
+    def __init__(self, capacity, error_rate=0.01, bits=None):
+        self.capacity = capacity
+        self.size = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class FreshnessPolicy:
+    """
+    Decides how long a stored verdict can be trusted before it must be re-checked upstream.
+
+    Blocklist entries never expire; flagged addresses rarely become clean, so they are trusted
+    longer than clean ones, which can turn risky at any time.
+    """
+
+    def __init__(self, clean_ttl=3 * 24 * 3600, flagged_ttl=30 * 24 * 3600):
+        self.clean_ttl = clean_ttl
+        self.flagged_ttl = flagged_ttl
+
+    def is_fresh(self, verdict, source, checked_at, now):
+        if source == SOURCE_BLOCKLIST:
+            return True
+        ttl = self.flagged_ttl if verdict == FLAGGED else self.clean_ttl
+        return now - checked_at < ttl
+
+
+class AddressRiskIndex:
+    """
+    Local index of address verdicts from past checks and imported blocklists.
+
+    Verdicts live in a sorted array saved as a .npy file and memory-mapped on load, plus a
+    small in-memory delta of recent results that is merged into the array by compact().
+    A Bloom filter over every indexed key answers "never seen" without touching either.
+
+    Worker processes share the array through the page cache. compact() runs under a lock
+    file and merges into the newest array on disk, then bumps a shared generation counter
+    so the other workers re-map the array on their next lookup.
+
+    Parameters:
+    - directory (str): Where the verdict array is persisted.
+    - policy (FreshnessPolicy): When stored verdicts must be re-checked.
+    - compact_every (int): Delta size that triggers a merge into the sorted array.
+    - generation (SharedCounter): Shared compaction counter, or None when only one process uses the directory.
+    """
+
+    def __init__(self, directory, policy=None, compact_every=50000, bloom_capacity=1000000, generation=None):
+        self.directory = directory
+        self.path = os.path.join(directory, 'verdicts.npy')
+        self.bloom_path = os.path.join(directory, 'bloom.bin')
+        self.policy = policy or FreshnessPolicy()
+        self.compact_every = compact_every
+        self.bloom_capacity = bloom_capacity
+        self.stats = {"hits": 0, "stale": 0, "misses": 0, "bloom_negatives": 0, "undetermined": 0}
+
+        self._lock = threading.RLock()
+        self._delta = {}  # key -> (verdict, source, risk_score, checked_at)
+        os.makedirs(directory, exist_ok=True)
+        self._directory_lock = FileLock(os.path.join(directory, '.lock'))
+        self.generation = generation
+        self._generation_seen = generation.value if generation is not None else 0
+        self._load()
+
+    def _load(self):
+        self._set_base(np.load(self.path, mmap_mode='r') if os.path.exists(self.path) else np.zeros(0, dtype=VERDICT_DTYPE))
+        self._load_bloom()
+        for key in self._delta:
+            self._bloom.add(key)
+
+    def refresh(self):
+        """
+        Re-maps the array and filter after another worker compacted them.
+        """
+        if self.generation is None or self.generation.value == self._generation_seen:
+            return
+        with self._lock:
+            self._generation_seen = self.generation.value
+            self._load()
+
+    def _set_base(self, base):
+        self._base = base
+        self._keys = base['key']
+
+    def __len__(self):
+        return len(self._base) + len(self._delta)
+
+    def _bloom_capacity(self):
+        capacity = self.bloom_capacity
+        while capacity < len(self._base) + self.compact_every:
+            capacity *= 2
+        return capacity
+
+    def _load_bloom(self):
+        # The filter is saved next to the array so large indexes do not rehash every key on startup
+        capacity = self._bloom_capacity()
+        bloom = BloomFilter(capacity)
+        if os.path.exists(self.bloom_path) and os.path.getsize(self.bloom_path) == len(bloom.bits) + 8:
+            with open(self.bloom_path, 'rb') as file:
+                saved_capacity = int.from_bytes(file.read(8), 'little')
+                if saved_capacity == capacity:
+                    bloom.bits = bytearray(file.read())
+                    self._bloom = bloom
+                    return
+        self._rebuild_bloom()
+
+    def _save_bloom(self):
+        temporary_path = self.bloom_path + '.tmp'
+        with open(temporary_path, 'wb') as file:
+            file.write(self._bloom.capacity.to_bytes(8, 'little'))
+            file.write(self._bloom.bits)
+        os.replace(temporary_path, self.bloom_path)
+
+    def _rebuild_bloom(self):
+        bloom = BloomFilter(self._bloom_capacity())
+        for key in self._keys:
+            bloom.add(bytes(key).ljust(20, b'\0'))
+        for key in self._delta:
+            bloom.add(key)
+        self._bloom = bloom
+
+    def _find(self, key):
+        entry = self._delta.get(key)
+        if entry is not None:
+            return entry
+        keys = self._keys
+        position = int(keys.searchsorted(key))
+        if position < len(keys) and keys[position].ljust(20, b'\0') == key:
+            verdict, source, risk_score, checked_at = self._base[position].item()[1:]
+            return verdict, source, risk_score, checked_at
+        return None
+
+    def lookup(self, address, now=None):
+        """
+        Returns the stored verdict for an address if it is still fresh.
+
+        Only the verdict is stored, not the upstream response: a hit carries address, status
+        ("clean" or "flagged"), risk_score, checked_at, source and cached=True, and any other
+        fields of the original response are absent.
+
+        Returns:
+        - dict or None: Verdict details, or None when the address must be checked upstream.
+        """
+        key = address_key(address)
+        if key is None:
+            return None
+        self.refresh()
+        if key not in self._bloom:
+            self.stats["bloom_negatives"] += 1
+            self.stats["misses"] += 1
+            return None
+
+        with self._lock:
+            entry = self._find(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        verdict, source, risk_score, checked_at = entry
+        if not self.policy.is_fresh(verdict, source, checked_at, now or time.time()):
+            self.stats["stale"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        return {
+            "address": address,
+            "status": VERDICT_NAMES[verdict],
+            "risk_score": None if math.isnan(risk_score) else risk_score,
+            "checked_at": checked_at,
+            "source": "blocklist" if source == SOURCE_BLOCKLIST else "previous_check",
+            "cached": True,
+        }
+
+    def record(self, address, result, now=None):
+        """
+        Stores the verdict from an upstream checkaddress response, unless the response does not
+        determine one; such addresses are checked upstream again next time.
+        """
+        key = address_key(address)
+        if key is None or not isinstance(result, dict) or 'error' in result:
+            return
+        verdict, risk_score = verdict_from_result(result)
+        if verdict is None:
+            self.stats["undetermined"] += 1
+            return
+        self._put(key, (verdict, SOURCE_CHECK, risk_score, now or time.time()))
+
+    def import_blocklist(self, addresses, now=None):
+        """
+        Marks every valid address in an iterable (e.g. lines of a file) as flagged permanently.
+
+        Returns:
+        - int: Number of addresses imported.
+        """
+        now = now or time.time()
+        imported = 0
+        for line in addresses:
+            key = address_key(line.split(',', 1)[0] if isinstance(line, str) else line)
+            if key is None:
+                continue
+            self._put(key, (FLAGGED, SOURCE_BLOCKLIST, float('nan'), now), compact=False)
+            imported += 1
+        self.compact()
+        return imported
+
+    def _put(self, key, entry, compact=True):
+        with self._lock:
+            existing = self._delta.get(key) or self._find(key)
+            # A blocklist entry is never downgraded by a later check
+            if existing is not None and existing[1] == SOURCE_BLOCKLIST and entry[1] != SOURCE_BLOCKLIST:
+                return
+            self._delta[key] = entry
+            self._bloom.add(key)
+            compact = compact and len(self._delta) >= self.compact_every
+        # Outside the lock: compact() takes the directory lock first
+        if compact:
+            self.compact()
+
+    def compact(self):
+        """
+        Merges the in-memory delta into the sorted array and rewrites it on disk.
+        """
+        with self._directory_lock.hold(), self._lock:
+            if not self._delta:
+                return
+            # Merge on top of whatever another worker last wrote, not the array mapped at startup
+            self.refresh()
+            delta = np.array([(key, *entry) for key, entry in self._delta.items()], dtype=VERDICT_DTYPE)
+            base = np.asarray(self._base)
+            if len(base):
+                # A blocklist entry from another worker is never downgraded by this worker's checks
+                protected = base[base['source'] == SOURCE_BLOCKLIST]['key']
+                delta = delta[(delta['source'] == SOURCE_BLOCKLIST) | ~np.isin(delta['key'], protected)]
+                base = base[~np.isin(base['key'], delta['key'])]
+            merged = np.concatenate([base, delta])
+            merged.sort(order='key')
+            self._write_base(merged)
+            self._delta = {}
+
+    def remove(self, addresses):
+        """
+        Deletes the stored verdicts, blocklist entries included, of every valid address in an iterable.
+
+        Removed addresses are checked upstream again on their next lookup.
+
+        Returns:
+        - int: Number of addresses that were in the index.
+        """
+        keys = {key for key in (address_key(address) for address in addresses) if key is not None}
+        if not keys:
+            return 0
+        with self._directory_lock.hold(), self._lock:
+            self.refresh()
+            removed = {key for key in keys if self._delta.pop(key, None) is not None}
+            base = np.asarray(self._base)
+            matches = np.isin(base['key'], np.array(sorted(keys), dtype='S20'))
+            if matches.any():
+                removed.update(bytes(key).ljust(20, b'\0') for key in base['key'][matches])
+                self._write_base(base[~matches])
+        return len(removed)
+
+    def _write_base(self, base):
+        # Called with the directory lock held; the Bloom filter keeps removed keys, which only costs a lookup
+        temporary_path = self.path + f'.{os.getpid()}.tmp.npy'
+        np.save(temporary_path, base)
+        os.replace(temporary_path, self.path)
+        self._set_base(np.load(self.path, mmap_mode='r'))
+        if len(self._base) + self.compact_every > self._bloom.capacity:
+            self._rebuild_bloom()
+        self._save_bloom()
+        if self.generation is not None:
+            self._generation_seen = self.generation.increment()
+
+
+# Function to build the index used by the API and flush its delta on shutdown
+def create_address_index(shared_state=None):
+    index = AddressRiskIndex(
+        os.getenv('ADDRESS_INDEX_DIR', '/tmp/address_index'),
+        policy=FreshnessPolicy(
+            clean_ttl=float(os.getenv('ADDRESS_INDEX_CLEAN_TTL', 3 * 24 * 3600)),
+            flagged_ttl=float(os.getenv('ADDRESS_INDEX_FLAGGED_TTL', 30 * 24 * 3600)),
+        ),
+        generation=shared_state.counter('address_index_generation') if shared_state is not None else None,
+    )
+    blocklist_path = os.getenv('ADDRESS_BLOCKLIST_PATH')
+    if blocklist_path and os.path.exists(blocklist_path):
+        with open(blocklist_path) as file:
+            index.import_blocklist(file)
+    atexit.register(index.compact)
+    return index
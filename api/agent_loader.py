@@ -0,0 +1,208 @@
+import os
+import re
+import json
+import inspect
+import threading
+import importlib.util
+from api.shared_state import FileLock
+
+AGENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'agents')
+
+# Generated agents live in hyphenated directories, which cannot be imported as packages
+AGENT_DIRECTORIES = {
+    "AI": "ai-agents",
+    "Smart": "smart-ai-agents",
+    "Quantum": "q-ai-agents",
+    "Beta": "beta-agents",
+}
+
+AGENT_FILE_PATTERN = re.compile(r'^(q?agent)(\d+)\.py$')
+
+
+# Function to derive an agent's name from its generated file name (agent3.py -> Agent3, qagent2.py -> QAgent2)
+def agent_name_from_filename(filename):
+    match = AGENT_FILE_PATTERN.match(filename)
+    if not match:
+        return None
+    prefix, number = match.groups()
+    return ('QAgent' if prefix == 'qagent' else 'Agent') + number
+
+
+# Function to guess the agent type from a name when the caller does not give one
+def default_agent_type(agent_name):
+    return 'Quantum' if agent_name.startswith('QAgent') else 'AI'
+
+
+class AgentLoader:
+    """
+    Index of generated agent modules with cached classes and per-agent endpoint routes.
+
+    The directories are scanned once; create_new_agent registers new files as it writes them,
+    so lookups and class loads after the first never touch the filesystem. Endpoint routes are
+    kept in memory, or once persist_routes() is called, also in a JSON file that every worker
+    reloads when a shared generation counter says another one changed it.
+    """
+
+    def __init__(self, agents_dir=AGENTS_DIR, directories=AGENT_DIRECTORIES):
+        self.agents_dir = agents_dir
+        self.directories = directories
+        self._modules = {}  # (agent_type, agent_name) -> module file path
+        self._classes = {}  # (agent_type, agent_name) -> agent class
+        self._routes = {}  # (agent_type, agent_name) -> {task: endpoint}
+        self._routes_path = None
+        self._routes_lock = None
+        self._routes_generation = None
+        self._routes_seen = 0
+        self._lock = threading.RLock()
+        self._indexed = False
+
+    def build_index(self):
+        with self._lock:
+            for agent_type, directory in self.directories.items():
+                path = os.path.join(self.agents_dir, directory)
+                if not os.path.isdir(path):
+                    continue
+                for filename in os.listdir(path):
+                    agent_name = agent_name_from_filename(filename)
+                    if agent_name:
+                        self._modules[(agent_type, agent_name)] = os.path.join(path, filename)
+            self._indexed = True
+
+    def _ensure_index(self):
+        if not self._indexed:
+            self.build_index()
+
+    def register(self, agent_type, agent_name, module_path):
+        """
+        Adds a newly generated agent module to the index.
+        """
+        self._ensure_index()
+        with self._lock:
+            key = (agent_type, agent_name)
+            self._modules[key] = module_path
+            self._classes.pop(key, None)
+
+    def has_agent(self, agent_type, agent_name):
+        self._ensure_index()
+        return (agent_type, agent_name) in self._modules
+
+    def count(self, agent_type):
+        self._ensure_index()
+        return sum(1 for indexed_type, _ in self._modules if indexed_type == agent_type)
+
+    def load_class(self, agent_type, agent_name):
+        """
+        Returns the agent class for a generated agent, importing its module on first use.
+
+        Raises:
+        - ModuleNotFoundError: The agent is not in the index.
+        - AttributeError: The module does not define an agent class.
+        """
+        key = (agent_type, agent_name)
+        agent_class = self._classes.get(key)
+        if agent_class is not None:
+            return agent_class
+
+        self._ensure_index()
+        with self._lock:
+            agent_class = self._classes.get(key)
+            if agent_class is not None:
+                return agent_class
+            module_path = self._modules.get(key)
+            if module_path is None:
+                raise ModuleNotFoundError(f"Agent module for {agent_name} not found.")
+
+            module_name = f"agents_{self.directories[agent_type].replace('-', '_')}_{agent_name.lower()}"
+            spec = importlib.util.spec_from_file_location(module_name, module_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+
+            # Prefer a class named after the agent, then the first class the module itself defines
+            agent_class = getattr(module, agent_name, None)
+            if agent_class is None:
+                defined = [value for _, value in inspect.getmembers(module, inspect.isclass) if value.__module__ == module_name]
+                if not defined:
+                    raise AttributeError(f"Agent {agent_name} not found in the module.")
+                agent_class = defined[0]
+            self._classes[key] = agent_class
+            return agent_class
+
+    def prewarm(self):
+        """
+        Imports every indexed agent module up front.
+
+        Returns:
+        - dict: Agents that failed to load, mapped to the error.
+        """
+        self._ensure_index()
+        failures = {}
+        for agent_type, agent_name in list(self._modules):
+            try:
+                self.load_class(agent_type, agent_name)
+            except Exception as e:
+                failures[f"{agent_type}/{agent_name}"] = str(e)
+        return failures
+
+    ### Endpoint routes ###
+
+    def persist_routes(self, path, generation=None):
+        """
+        Keeps endpoint routes in a JSON file shared by every worker and loads the routes saved there.
+
+        Parameters:
+        - path (str): Routes file; created on the first assignment.
+        - generation (SharedCounter): Bumped on every assignment, or None when only one process uses the file.
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._lock:
+            self._routes_path = path
+            self._routes_lock = FileLock(path + '.lock')
+            self._routes_generation = generation
+            self._load_routes()
+
+    def _load_routes(self):
+        # Read the generation first, so a write that lands during the load is picked up next time
+        self._routes_seen = self._routes_generation.value if self._routes_generation is not None else 0
+        try:
+            with open(self._routes_path) as file:
+                saved = json.load(file)
+        except (FileNotFoundError, ValueError):
+            saved = {}
+        self._routes = {tuple(key.split('/', 1)): endpoints for key, endpoints in saved.items()}
+
+    def _refresh_routes(self):
+        if self._routes_generation is None or self._routes_generation.value == self._routes_seen:
+            return
+        with self._lock:
+            self._load_routes()
+
+    def set_endpoints(self, agent_type, agent_name, endpoints):
+        with self._lock:
+            if self._routes_path is None:
+                self._routes[(agent_type, agent_name)] = dict(endpoints)
+                return
+            with self._routes_lock.hold():
+                # Start from what other workers saved, not this worker's copy
+                self._load_routes()
+                self._routes[(agent_type, agent_name)] = dict(endpoints)
+                temporary_path = f"{self._routes_path}.{os.getpid()}.tmp"
+                with open(temporary_path, 'w') as file:
+                    json.dump({f"{key[0]}/{key[1]}": routes for key, routes in self._routes.items()}, file)
+                os.replace(temporary_path, self._routes_path)
+                if self._routes_generation is not None:
+                    self._routes_seen = self._routes_generation.increment()
+
+    def get_endpoints(self, agent_type, agent_name):
+        self._refresh_routes()
+        return self._routes.get((agent_type, agent_name), {})
+
+    def route(self, agent_type, agent_name, task):
+        """
+        Returns the endpoint assigned to an agent for a task, or None.
+        """
+        self._refresh_routes()
+        return self._routes.get((agent_type, agent_name), {}).get(task)
+
+
+# Shared loader for the API process
+agent_loader = AgentLoader()
@@ -0,0 +1,367 @@
+import os
+import json
+import mmap
+import time
+import atexit
+import struct
+import threading
+from api.shared_state import FileLock
+
+SEGMENT_MAGIC = b'IDFASEG1'
+RECORD_HEADER = struct.Struct('<BHI')  # op, key length, payload length
+OP_UPSERT = 1
+OP_DELETE = 2
+
+# Tasks and results kept per agent in the checkpoint; older entries are dropped
+HISTORY_LIMIT = 50
+
+# Generated agent type used to rebuild a restored agent in each tier
+TIER_AGENT_TYPES = {"Free": "AI", "Standard": "AI", "Smart": "Smart", "Quantum": "Quantum"}
+
+
+def _encode_key(tier, name):
+    return f"{tier}/{name}".encode('utf-8')
+
+
+def _encode_state(state):
+    return json.dumps(state, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def _decode_key(key):
+    tier, name = bytes(key).decode('utf-8').split('/', 1)
+    return tier, name
+
+
+# Function to merge another worker's copy of an agent's state into this worker's copy
+def _merge_state(state, other):
+    for field in ("tasks", "results"):
+        entries = {(entry["at"], json.dumps(entry["value"], sort_keys=True, default=str)): entry
+                   for entry in other.get(field, []) + state.get(field, [])}
+        state[field] = [entries[entry_key] for entry_key in sorted(entries)][-HISTORY_LIMIT:]
+    if other.get("updated_at", 0) > state.get("updated_at", 0):
+        state.update({field: value for field, value in other.items() if field not in ("tasks", "results")})
+
+
+class AgentStateStore:
+    """
+    Agent state (tier, assigned tasks, results) checkpointed to append-only binary segments.
+
+    Each checkpoint writes only the agents changed since the last one as a new segment file.
+    On restore the segments are memory-mapped and scanned for record offsets only; a record's
+    JSON payload is decoded the first time that agent is read, so restoring tens of thousands
+    of agents costs one pass over the record headers.
+
+    Several worker processes can share one directory. Segments are numbered and written under
+    a lock file, each writer first replays the segments it has not seen yet, and task and
+    result histories changed in two workers are merged rather than overwritten. A shared
+    generation counter, bumped after every write, tells the other workers when to replay.
+
+    Parameters:
+    - directory (str): Where segment files are kept.
+    - checkpoint_interval (float): Seconds between background checkpoints.
+    - max_segments (int): Segment count that triggers compaction into a single snapshot.
+    - generation (SharedCounter): Shared write counter, or None when only one process uses the directory.
+    """
+
+    def __init__(self, directory, checkpoint_interval=10.0, max_segments=32, generation=None):
+        self.directory = directory
+        self.checkpoint_interval = checkpoint_interval
+        self.max_segments = max_segments
+        self.generation = generation
+        os.makedirs(directory, exist_ok=True)
+
+        self._records = {}  # (tier, name) -> decoded state dict
+        self._lazy = {}  # (tier, name) -> (mmap, start, end) of an undecoded payload
+        self._dirty = {}  # (tier, name) -> OP_UPSERT or OP_DELETE
+        self._maps = {}  # id(mmap) -> [mmap, references from _lazy]; closed when nothing points into it
+        self._segments_seen = set()
+        self._generation_seen = generation.value if generation is not None else 0
+        self._lock = threading.RLock()
+        self._directory_lock = FileLock(os.path.join(directory, '.lock'))
+        self._worker = None
+        self._worker_pid = None
+        self._stopping = threading.Event()
+
+    ### Reading and updating state ###
+
+    def keys(self):
+        self.refresh()
+        with self._lock:
+            return list(self._records.keys() | self._lazy.keys())
+
+    def __len__(self):
+        self.refresh()
+        with self._lock:
+            return len(self._records.keys() | self._lazy.keys())
+
+    def get(self, tier, name):
+        self.refresh()
+        key = (tier, name)
+        with self._lock:
+            state = self._records.get(key)
+            if state is None and key in self._lazy:
+                mapped, start, end = self._lazy[key]
+                state = self._records[key] = json.loads(mapped[start:end])
+                self._drop_lazy(key)
+            return state
+
+    def _set_lazy(self, key, entry):
+        # Take the new reference before dropping the old one, which may point into the same map
+        self._maps[id(entry[0])][1] += 1
+        self._drop_lazy(key)
+        self._lazy[key] = entry
+
+    def _drop_lazy(self, key):
+        entry = self._lazy.pop(key, None)
+        if entry is not None:
+            self._release_map(entry[0])
+
+    def _release_map(self, mapped):
+        reference = self._maps[id(mapped)]
+        reference[1] -= 1
+        if reference[1] == 0:
+            del self._maps[id(mapped)]
+            mapped.close()
+
+    def _state_for_update(self, tier, name):
+        state = self.get(tier, name)
+        if state is None:
+            state = self._records[(tier, name)] = {
+                "tier": tier, "name": name, "agent_type": TIER_AGENT_TYPES.get(tier, "AI"),
+                "created_at": time.time(), "tasks": [], "results": [],
+            }
+        return state
+
+    def upsert(self, tier, name, **fields):
+        with self._lock:
+            state = self._state_for_update(tier, name)
+            state.update(fields)
+            state["updated_at"] = time.time()
+            self._dirty[(tier, name)] = OP_UPSERT
+        self._ensure_worker()
+
+    def record_task(self, tier, name, task):
+        self._append(tier, name, "tasks", task)
+
+    def record_result(self, tier, name, result):
+        self._append(tier, name, "results", result)
+
+    def _append(self, tier, name, field, value):
+        with self._lock:
+            state = self._state_for_update(tier, name)
+            history = state[field]
+            history.append({"at": time.time(), "value": value})
+            del history[:-HISTORY_LIMIT]
+            state["updated_at"] = time.time()
+            self._dirty[(tier, name)] = OP_UPSERT
+        self._ensure_worker()
+
+    def remove(self, tier, name):
+        with self._lock:
+            self._records.pop((tier, name), None)
+            self._drop_lazy((tier, name))
+            self._dirty[(tier, name)] = OP_DELETE
+        self._ensure_worker()
+
+    ### Segments ###
+
+    def _segment_paths(self):
+        names = sorted(name for name in os.listdir(self.directory) if name.startswith('segment-') and name.endswith('.bin'))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def _write_segment(self, records):
+        # Callers hold the directory lock, so the next number is one past the newest segment on disk
+        paths = self._segment_paths()
+        number = int(os.path.basename(paths[-1])[8:16]) + 1 if paths else 0
+        path = os.path.join(self.directory, f"segment-{number:08d}.bin")
+
+        chunks = [SEGMENT_MAGIC]
+        for (tier, name), op, payload in records:
+            key = _encode_key(tier, name)
+            chunks.append(RECORD_HEADER.pack(op, len(key), len(payload)))
+            chunks.append(key)
+            chunks.append(payload)
+
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as file:
+            file.write(b''.join(chunks))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+        self._segments_seen.add(path)
+        return path
+
+    def _bump_generation(self):
+        if self.generation is not None:
+            self._generation_seen = self.generation.increment()
+
+    def checkpoint(self):
+        """
+        Writes every agent changed since the last checkpoint to a new segment.
+
+        Returns:
+        - int: Number of records written.
+        """
+        with self._directory_lock.hold():
+            with self._lock:
+                # Fold in other workers' segments first so this one is written on top of them
+                self._replay_unseen()
+                if not self._dirty:
+                    return 0
+                dirty, self._dirty = self._dirty, {}
+                # Encode under the lock so the snapshot is consistent; the file write happens outside it
+                records = [(key, op, _encode_state(self._records[key]) if op == OP_UPSERT else b'')
+                           for key, op in dirty.items()]
+            try:
+                self._write_segment(records)
+            except OSError:
+                # Put the changes back so the next checkpoint retries them
+                with self._lock:
+                    for key, op in dirty.items():
+                        self._dirty.setdefault(key, op)
+                raise
+        self._bump_generation()
+        if len(self._segment_paths()) > self.max_segments:
+            self.compact()
+        return len(records)
+
+    def compact(self):
+        """
+        Rewrites all current state as one snapshot segment and removes the older segments.
+        """
+        with self._directory_lock.hold():
+            with self._lock:
+                self._replay_unseen()
+                for tier, name in list(self._lazy):
+                    self.get(tier, name)
+                old_paths = self._segment_paths()
+                records = [(key, OP_UPSERT, _encode_state(state)) for key, state in self._records.items()]
+                self._write_segment(records)
+                self._dirty = {}
+            for path in old_paths:
+                os.remove(path)
+        self._bump_generation()
+
+    def restore(self):
+        """
+        Loads state from the segment files, replaying them oldest first.
+
+        Returns:
+        - int: Number of agents restored.
+        """
+        with self._lock:
+            self._replay_unseen()
+            return len(self._records.keys() | self._lazy.keys())
+
+    def refresh(self):
+        """
+        Replays segments other workers wrote since the shared generation last changed.
+        """
+        if self.generation is None or self.generation.value == self._generation_seen:
+            return
+        with self._lock:
+            self._generation_seen = self.generation.value
+            self._replay_unseen()
+
+    def _replay_unseen(self):
+        for path in self._segment_paths():
+            if path in self._segments_seen:
+                continue
+            self._segments_seen.add(path)
+            try:
+                if os.path.getsize(path) <= len(SEGMENT_MAGIC):
+                    continue
+                with open(path, 'rb') as file:
+                    mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except FileNotFoundError:
+                continue  # Removed by a compaction whose snapshot is replayed instead
+            if mapped[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+                mapped.close()
+                continue
+            # The scan holds a reference of its own so the map stays open until every record is read
+            self._maps[id(mapped)] = [mapped, 1]
+
+            offset = len(SEGMENT_MAGIC)
+            size = len(mapped)
+            while offset + RECORD_HEADER.size <= size:
+                op, key_length, payload_length = RECORD_HEADER.unpack_from(mapped, offset)
+                key_start = offset + RECORD_HEADER.size
+                payload_start = key_start + key_length
+                offset = payload_start + payload_length
+                if offset > size:
+                    break  # Truncated tail from an interrupted write
+                key = _decode_key(mapped[key_start:payload_start])
+                if key in self._dirty:
+                    # Changed here too: keep both workers' history instead of either one
+                    if op == OP_UPSERT and key in self._records:
+                        _merge_state(self._records[key], json.loads(mapped[payload_start:offset]))
+                    continue
+                self._records.pop(key, None)
+                if op == OP_UPSERT:
+                    self._set_lazy(key, (mapped, payload_start, offset))
+                else:
+                    self._drop_lazy(key)
+            self._release_map(mapped)
+
+    ### Background checkpoints ###
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+                return
+            self._stopping.clear()
+            self._worker = threading.Thread(target=self._run, name='agent-checkpoint', daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def _run(self):
+        while not self._stopping.wait(self.checkpoint_interval):
+            try:
+                self.checkpoint()
+            except Exception as e:
+                print(f"Agent state checkpoint failed: {str(e)}")
+
+    def stop(self):
+        self._stopping.set()
+        self.checkpoint()
+
+
+class RestoredAgent:
+    """
+    Placeholder for an agent restored from a checkpoint; the real agent is built on first dispatch.
+    """
+
+    def __init__(self, tier, name, store):
+        self.tier = tier
+        self.name = name
+        self.store = store
+
+    def get_status(self):
+        state = self.store.get(self.tier, self.name) or {}
+        results = state.get("results", [])
+        return {
+            "name": self.name,
+            "status": "restored",
+            "tasks_assigned": len(state.get("tasks", [])),
+            "last_result": results[-1]["value"] if results else None,
+            "updated_at": state.get("updated_at"),
+        }
+
+    def materialize(self, loader):
+        state = self.store.get(self.tier, self.name) or {}
+        agent_class = loader.load_class(state.get("agent_type", TIER_AGENT_TYPES.get(self.tier, "AI")), self.name)
+        return agent_class(self.name)
+
+
+# Function to build the store used by the API, restore it and checkpoint once more on shutdown
+def create_agent_state_store(shared_state=None):
+    store = AgentStateStore(
+        os.getenv('AGENT_STATE_DIR', '/tmp/agent_state'),
+        checkpoint_interval=float(os.getenv('AGENT_CHECKPOINT_INTERVAL', 10)),
+        generation=shared_state.counter('agent_state_generation') if shared_state is not None else None,
+    )
+    store.restore()
+    atexit.register(store.stop)
+    return store
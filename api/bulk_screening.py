@@ -0,0 +1,132 @@
+import io
+import csv
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Upstream errors worth retrying after a pause, as opposed to per-address failures
+RETRYABLE_ERRORS = ("overloaded", "circuit open")
+
+
+# Function to read addresses from an uploaded .csv (address column or first column), .json or .txt file
+def read_addresses(uploaded_file):
+    filename = uploaded_file.filename.lower()
+    if filename.endswith('.json'):
+        data = json.load(uploaded_file.stream)
+        return list(data.keys()) if isinstance(data, dict) else list(data)
+
+    text = io.TextIOWrapper(uploaded_file.stream, encoding='utf-8', errors='ignore')
+    if filename.endswith('.csv'):
+        reader = csv.reader(text)
+        header = next(reader, [])
+        column = header.index('address') if 'address' in header else 0
+        addresses = [] if 'address' in header else header[:1]
+        addresses.extend(row[column] for row in reader if len(row) > column)
+        return addresses
+    return [line.strip() for line in text if line.strip()]
+
+
+# Function to check one address, retrying when the upstream sheds load
+def check_with_retries(address, check, retries=3, backoff=0.5):
+    for attempt in range(retries + 1):
+        result = check(address)
+        error = result.get('error') if isinstance(result, dict) else None
+        if not error or not any(reason in error for reason in RETRYABLE_ERRORS) or attempt == retries:
+            return result
+        time.sleep(backoff * (2 ** attempt))
+
+
+def screen_addresses(addresses, lookup, check, record, concurrency=32):
+    """
+    Screens addresses against the local index first and fans the rest out to the upstream.
+
+    Verdicts are yielded as soon as they are available, not in input order. At most
+    `concurrency` upstream checks are in flight and at most twice that many are queued,
+    so memory stays flat however long the address list is.
+
+    Parameters:
+    - addresses (iterable): Validated, deduplicated addresses.
+    - lookup (callable): Returns a cached verdict dict or None.
+    - check (callable): Performs the upstream check and returns its response dict.
+    - record (callable): Stores a fresh upstream verdict.
+    - concurrency (int): Maximum concurrent upstream checks.
+
+    Yields:
+    - dict: One verdict per address, with "address" and either the result or "error".
+    """
+    def run_check(address):
+        result = check_with_retries(address, check)
+        if isinstance(result, dict) and 'error' not in result and not result.get('stale'):
+            record(address, result)
+        return address, result
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = set()
+        for address in addresses:
+            cached = lookup(address)
+            if cached is not None:
+                yield cached
+                continue
+
+            pending.add(executor.submit(run_check, address))
+            if len(pending) >= concurrency * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield _verdict(*future.result())
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield _verdict(*future.result())
+
+
+def _verdict(address, result):
+    if not isinstance(result, dict):
+        return {"address": address, "error": "Unexpected response from security check"}
+    if 'error' in result:
+        return {"address": address, "error": result['error']}
+    return dict(result, address=address, cached=False)
+
+
+class ScreeningSummary:
+    """
+    Running totals for a bulk screening job, reported once every verdict has been streamed.
+    """
+
+    def __init__(self, submitted, invalid, duplicates):
+        self.started_at = time.monotonic()
+        self.submitted = submitted
+        self.invalid = invalid
+        self.duplicates = duplicates
+        self.screened = 0
+        self.from_index = 0
+        self.errors = 0
+        self.by_status = {}
+        self.flagged = []
+
+    def add(self, verdict):
+        self.screened += 1
+        if 'error' in verdict:
+            self.errors += 1
+            return
+        if verdict.get('cached'):
+            self.from_index += 1
+        status = str(verdict.get('status', 'unknown')).lower()
+        self.by_status[status] = self.by_status.get(status, 0) + 1
+        if status not in ('clean', 'unknown'):
+            self.flagged.append(verdict['address'])
+
+    def report(self):
+        elapsed = time.monotonic() - self.started_at
+        return {
+            "submitted": self.submitted,
+            "invalid": self.invalid,
+            "duplicates": self.duplicates,
+            "screened": self.screened,
+            "answered_from_index": self.from_index,
+            "errors": self.errors,
+            "by_status": self.by_status,
+            "flagged_addresses": self.flagged,
+            "elapsed_seconds": round(elapsed, 3),
+            "addresses_per_second": round(self.screened / elapsed, 1) if elapsed else None,
+        }
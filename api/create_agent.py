@@ -1,16 +1,16 @@
 import os
 import shutil
 import openai
+from api.agent_loader import agent_loader, AGENTS_DIR, AGENT_DIRECTORIES
 
 # Set up OpenAI API key from environment variable
 openai.api_key = os.getenv("NEXT_PUBLIC_OPENAI_API_KEY")
 
 # Define directories for AI agents, Smart AI agents, Beta agents, and Quantum AI agents
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-BETA_AGENTS_DIR = os.path.join(BASE_DIR, 'agents/beta_agents')
-AI_AGENTS_DIR = os.path.join(BASE_DIR, 'agents/ai_agents')
-SMART_AI_AGENTS_DIR = os.path.join(BASE_DIR, 'agents/smart_ai_agents')
-AI_Q_AGENTS_DIR = os.path.join(BASE_DIR, 'agents/q_ai_agents')
+BETA_AGENTS_DIR = os.path.join(AGENTS_DIR, AGENT_DIRECTORIES['Beta'])
+AI_AGENTS_DIR = os.path.join(AGENTS_DIR, AGENT_DIRECTORIES['AI'])
+SMART_AI_AGENTS_DIR = os.path.join(AGENTS_DIR, AGENT_DIRECTORIES['Smart'])
+AI_Q_AGENTS_DIR = os.path.join(AGENTS_DIR, AGENT_DIRECTORIES['Quantum'])
 
 # Templates for different agent types
 TEMPLATE_AI_AGENT = os.path.join(AI_AGENTS_DIR, 'agent_template.py')
@@ -34,11 +34,6 @@ def generate_agent_image(agent_type):
     except Exception as e:
         return {"error": f"Failed to generate image: {str(e)}"}
 
-# Function to count existing agents in a directory
-def count_existing_agents(directory):
-    agent_files = [f for f in os.listdir(directory) if (f.startswith('agent') or f.startswith('qagent')) and f.endswith('.py')]
-    return len(agent_files)
-
 # Function to create a new AI or Quantum AI agent
 def create_new_agent(agent_type='AI', beta_role=None):
     """
@@ -68,9 +63,12 @@ def create_new_agent(agent_type='AI', beta_role=None):
     else:
         return {"error": "Invalid agent type. Use 'AI', 'Smart', 'Beta', or 'Quantum'."}
 
-    agent_count = count_existing_agents(directory)
-    new_agent_number = agent_count + 1
+    # The loader's index only holds generated agents, so templates are not counted
+    new_agent_number = agent_loader.count(agent_type) + 1
     new_agent_name = f'Agent{new_agent_number}' if agent_type in ['AI', 'Beta', 'Smart'] else f'QAgent{new_agent_number}'
+    while agent_loader.has_agent(agent_type, new_agent_name):
+        new_agent_number += 1
+        new_agent_name = f'Agent{new_agent_number}' if agent_type in ['AI', 'Beta', 'Smart'] else f'QAgent{new_agent_number}'
 
     # Generate the agent image using DALL·E
     image_url = generate_agent_image(beta_role or agent_type)
@@ -121,6 +119,9 @@ agent_image_url = "{image_url}"
             with open(new_agent_filepath, 'w') as file:
                 file.write(agent_code)
 
+            # Make the new agent routable without rescanning the agent directories
+            agent_loader.register(agent_type, new_agent_name, new_agent_filepath)
+
             return {"message": f"New {agent_type} agent created: {new_agent_name} -> {new_agent_filepath}", "image_url": image_url}
         else:
             return {"error": f"Template file '{template}' not found."}
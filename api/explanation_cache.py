@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from api.instrumentation import Counter, Gauge, registry
+from api.shared_state import FileLock
+
+# Characters fed to the hash per update, so large images are never copied whole
+HASH_CHUNK_SIZE = 1024 * 1024
+
+explanation_cache_lookups = Counter('idefi_explanation_cache_lookups_total', 'Explanation cache lookups by result.', ('result',))
+explanation_cache_bytes = Gauge('idefi_explanation_cache_bytes', 'Bytes of explanations held in the on-disk cache.')
+registry.extend([explanation_cache_lookups, explanation_cache_bytes])
+
+
+# Function to hash the explanation inputs without decoding the base64 images
+def explanation_key(risk_scores, histogram_base64, circuit_base64):
+    hasher = hashlib.blake2b(digest_size=32)
+    for value in (risk_scores, histogram_base64, circuit_base64):
+        # Anything but text (risk scores, malformed images) is hashed as canonical JSON, tagged apart from text
+        tag = b's'
+        if not isinstance(value, str):
+            value, tag = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str), b'j'
+        # A type tag and length prefix keep ("ab", "c") and ("a", "bc") from hashing alike
+        hasher.update(tag + len(value).to_bytes(8, 'little'))
+        for start in range(0, len(value), HASH_CHUNK_SIZE):
+            hasher.update(value[start:start + HASH_CHUNK_SIZE].encode('utf-8', 'surrogatepass'))
+    return hasher.hexdigest()
+
+
+class _ProcessCounter:
+    """
+    Stand-in for a SharedCounter when the cache directory is used by one process only.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+    def increment(self, amount=1):
+        with self._lock:
+            self.value += amount
+            return self.value
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class ExplanationCache:
+    """
+    Size-bounded LRU of generated explanations kept as one JSON file per input hash.
+
+    Any worker on the host can serve an entry another worker wrote, since lookups go to the
+    file directly, and reads bump the file's modification time to mark it recently used.
+    The bytes and entries on disk are tracked in shared counters. Once the bytes pass
+    max_bytes, one process at a time scans the directory under a lock file, deletes the
+    least recently used files down to 90% of the budget and resets the counters to what
+    it found, so any drift between workers is corrected on every eviction. Concurrent
+    requests for the same key in one process share a single upstream call.
+
+    Parameters:
+    - directory (str): Where entries are written.
+    - max_bytes (int): Size budget for cached explanations, across all workers.
+    - ttl (float): Seconds an explanation is reused before it is generated again.
+    - counters (tuple): Shared (bytes, entries) counters, or None when only one process uses the directory.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, ttl=7 * 24 * 3600, counters=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._bytes, self._entries = counters or (_ProcessCounter(), _ProcessCounter())
+        self._inflight = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._directory_lock = FileLock(os.path.join(directory, '.lock'))
+        self._evict(force=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _evict(self, force=False):
+        """
+        Rescans the directory and removes the least recently used entries while it is over budget.
+        """
+        with self._directory_lock.hold():
+            # Another process may have evicted while this one waited for the lock
+            if not force and self._bytes.value <= self.max_bytes:
+                return
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    try:
+                        stat = os.stat(os.path.join(self.directory, name))
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, name, stat.st_size))
+            entries.sort()
+
+            total = sum(size for _, _, size in entries)
+            # Evict to below the budget so the next few writes do not each trigger a scan
+            target = self.max_bytes * 0.9 if total > self.max_bytes else self.max_bytes
+            removed = 0
+            while total > target and removed < len(entries):
+                _, name, size = entries[removed]
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            self._bytes.set(total)
+            self._entries.set(len(entries) - removed)
+        explanation_cache_bytes.set(total)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                entry = json.loads(file.read())
+        except (FileNotFoundError, ValueError):
+            return None
+        if time.time() - entry["created_at"] > self.ttl:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # Evicted by another worker just now; the entry read is still good
+        return entry["response"]
+
+    def put(self, key, response):
+        content = json.dumps({"created_at": time.time(), "response": response}, default=str).encode('utf-8')
+        path = self._path(key)
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, 'wb') as file:
+            file.write(content)
+        try:
+            replaced = os.stat(path).st_size
+        except FileNotFoundError:
+            replaced = None
+        os.replace(temporary_path, path)
+
+        if replaced is None:
+            self._entries.increment()
+        total = self._bytes.increment(len(content) - (replaced or 0))
+        explanation_cache_bytes.set(total)
+        if total > self.max_bytes:
+            self._evict()
+
+    def get_or_generate(self, key, generate):
+        """
+        Returns the cached explanation for a key, or calls generate() once for all concurrent callers.
+
+        Error responses and stale fallbacks are returned but not cached.
+
+        Returns:
+        - tuple: (response, "hit" | "shared" | "miss").
+        """
+        response = self.get(key)
+        if response is not None:
+            explanation_cache_lookups.inc('hit')
+            return response, 'hit'
+
+        with self._lock:
+            inflight = self._inflight.get(key)
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight[key] = _InFlight()
+        if not leader:
+            inflight.done.wait()
+            explanation_cache_lookups.inc('shared')
+            return inflight.result, 'shared'
+
+        try:
+            response = inflight.result = generate()
+            if isinstance(response, dict) and 'error' not in response and not response.get('stale'):
+                self.put(key, response)
+        except Exception as e:
+            inflight.result = {"error": str(e)}
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            inflight.done.set()
+        explanation_cache_lookups.inc('miss')
+        return response, 'miss'
+
+    def status(self):
+        with self._lock:
+            in_flight = len(self._inflight)
+        return {"entries": self._entries.value, "bytes": self._bytes.value, "max_bytes": self.max_bytes,
+                "in_flight": in_flight}
+
+
+# Function to build the cache used by the API, with its size tracked in the segment shared by every worker
+def create_explanation_cache(shared_state=None):
+    counters = None
+    if shared_state is not None:
+        counters = (shared_state.counter('explanation_cache_bytes'), shared_state.counter('explanation_cache_entries'))
+    return ExplanationCache(
+        os.getenv('EXPLANATION_CACHE_DIR', '/tmp/explanation_cache'),
+        max_bytes=int(os.getenv('EXPLANATION_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+        ttl=float(os.getenv('EXPLANATION_CACHE_TTL', 7 * 24 * 3600)),
+        counters=counters,
+    )
@@ -5,10 +5,25 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import requests
 import base64
 import json
-from flask import Flask, jsonify, request, make_response
+import hmac
+from flask import Flask, Response, jsonify, request, make_response, stream_with_context
 from werkzeug.utils import secure_filename
 from api.create_agent import create_new_agent
+from api.agent_loader import agent_loader
+from api.assign_endpoints import assign_agent_endpoints
+from api.agent_state import create_agent_state_store, RestoredAgent, TIER_AGENT_TYPES
+from api.status_stream import StatusBroadcaster, stream_status_events
+from api.shared_state import create_shared_state, SharedStatusFollower
 from api.nfa_image import generate_nft_image
+from api.notification_outbox import create_notification_outbox
+from api.instrumentation import instrument_app, track_upstream, track_stage, record_error
+from api.resilience import UpstreamGuard, UpstreamUnavailable
+from api.scheduler import create_agent_scheduler
+from api.address_index import create_address_index, address_key
+from api.bulk_screening import read_addresses, screen_addresses, ScreeningSummary
+from api.upload_store import UploadResultStore, content_hash
+from api.explanation_cache import create_explanation_cache, explanation_key
+from api.quantum_memory import create_quantum_memory, validate_operations
 from uagents import Agent, Context
 import threading
 from firebase_admin import credentials, initialize_app, firestore, storage
@@ -20,6 +35,7 @@ import pandas as pd
 
 app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": ["https://q.idefi.ai", "https://api.idefi.ai", "https://agents.idefi.ai", "https://idefi.ai", "https://mup-nine.vercel.app", "http://localhost:3000"]}})
+instrument_app(app)
 
 # Firebase setup
 firebase_service_account_key_base64 = os.getenv('NEXT_PUBLIC_FIREBASE_SERVICE_ACCOUNT_KEY')
@@ -44,6 +60,12 @@ except Exception as e:
 
 db = firestore.client(firebase_app)
 
+# Outbox that batches email notifications to Firestore off the request thread
+notification_outbox = create_notification_outbox(db)
+
+# Counters, agent statuses and cache generations shared by every gunicorn worker
+shared_state = create_shared_state()
+
 # Dictionary to store agents
 agent_instances = {
     "Free": {},
@@ -52,66 +74,222 @@ agent_instances = {
     "Quantum": {}
 }
 
-# Tracking dictionary to keep count of agents created by role
-agent_tracking = {
-    "Miner": 0,
-    "Builder": 0,
-    "Defender": 0,
-    "Scout": 0,
-    "Healer": 0,
-    "multi_role_agents": 0,
-    "total_agents": 0
-}
+# Checkpointed agent state; agents from the last checkpoint come back as lightweight handles
+agent_state = create_agent_state_store(shared_state)
+for restored_tier, restored_name in agent_state.keys():
+    agent_instances.setdefault(restored_tier, {}).setdefault(restored_name, RestoredAgent(restored_tier, restored_name, agent_state))
+
+# Pushes agent status changes to dashboards subscribed to /api/agents_status_stream. Each open stream holds a
+# connection for up to STATUS_STREAM_MAX_AGE seconds; gunicorn.conf.py sizes the per-worker cap to the worker class
+STATUS_STREAM_MAX_SUBSCRIBERS = int(os.getenv('STATUS_STREAM_MAX_SUBSCRIBERS', 4))
+STATUS_STREAM_MAX_AGE = float(os.getenv('STATUS_STREAM_MAX_AGE', 300))
+status_broadcaster = StatusBroadcaster(max_subscribers=STATUS_STREAM_MAX_SUBSCRIBERS)
+status_follower = SharedStatusFollower(shared_state, status_broadcaster)
+
+# Tracking counters of agents created by role, kept in shared memory so every worker reports the same counts
+agent_tracking = shared_state.counter_map([
+    "Miner",
+    "Builder",
+    "Defender",
+    "Scout",
+    "Healer",
+    "multi_role_agents",
+    "total_agents"
+])
 
 # Base URLs for external API calls
-Q_IDEFI_API_URL = "https://q.idefi.ai/api"
-IDEFI_API_URL = "https://api.idefi.ai/api"
+Q_IDEFI_API_URL = os.getenv('Q_IDEFI_API_URL', "https://q.idefi.ai/api")
+IDEFI_API_URL = os.getenv('IDEFI_API_URL', "https://api.idefi.ai/api")
 INTERNAL_API_BASE = "/api"  # for internal route calls
 
+# Upstream timeouts in seconds (connect, read)
+Q_IDEFI_TIMEOUT = (3.05, float(os.getenv('Q_IDEFI_TIMEOUT', 30)))
+IDEFI_TIMEOUT = (3.05, float(os.getenv('IDEFI_TIMEOUT', 15)))
+
+# Pooled keep-alive connections to the upstreams, sized to cover bulk screening fan-out
+upstream_session = requests.Session()
+upstream_session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=64))
+upstream_session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=64))
+
+# Each upstream gets its own bulkhead and circuit breaker so a slow q.idefi.ai cannot starve api.idefi.ai calls
+upstream_guards = {
+    "q.idefi.ai": UpstreamGuard("q.idefi.ai", cacheable_endpoints={
+        'checkaddress', 'quantum_risk_analysis', 'portfolio_optimization'
+    }),
+    "api.idefi.ai": UpstreamGuard("api.idefi.ai", cacheable_endpoints={
+        'basic_metrics', 'intermediate_metrics', 'advanced_metrics', 'visualize_address', 'list_json_files'
+    }),
+}
+
+# Per-tier rate limits and weighted fair admission for agent endpoints
+agent_scheduler = create_agent_scheduler()
+
+# Local index of past security check verdicts and imported blocklists
+address_index = create_address_index(shared_state)
+
+# Credential for index administration (blocklist import and removal); those routes are disabled while it is unset
+ADDRESS_INDEX_ADMIN_TOKEN = os.getenv('ADDRESS_INDEX_ADMIN_TOKEN')
+
+# Concurrent upstream checks per bulk screening job; each also holds an agent scheduler slot, waiting up to
+# BULK_SCREENING_WAIT seconds for it and for a token of the bulk budget (BULK_SCREENING_RATE checks per second
+# across all jobs, read by create_agent_scheduler), which should match what q.idefi.ai can absorb
+BULK_SCREENING_CONCURRENCY = int(os.getenv('BULK_SCREENING_CONCURRENCY', 16))
+BULK_SCREENING_WAIT = float(os.getenv('BULK_SCREENING_WAIT', 30))
+
+# Per-address upload results and upload fingerprints for incremental re-processing
+upload_store = UploadResultStore(os.getenv('UPLOAD_STORE_DB', '/tmp/upload_store.db'))
+
+# Explanations already generated for identical risk scores and images
+explanation_cache = create_explanation_cache(shared_state)
+
+# Local single-qubit memory per session, shared by every worker; sessionless calls still go to q.idefi.ai
+# unless QUANTUM_MEMORY_LOCAL=1 routes them to a "default" session
+quantum_memory = create_quantum_memory(shared_state)
+QUANTUM_MEMORY_LOCAL = os.getenv('QUANTUM_MEMORY_LOCAL') == '1'
+QUANTUM_MEMORY_MAX_OPERATIONS = int(os.getenv('QUANTUM_MEMORY_MAX_OPERATIONS', 1000))
+# Capped by the table, which only guarantees room for half its slots per call
+QUANTUM_MEMORY_MAX_SESSIONS = min(int(os.getenv('QUANTUM_MEMORY_MAX_SESSIONS', 10000)), quantum_memory.max_sessions)
+
+# Index generated agent modules once at startup, optionally importing them all up front. Endpoint routes are saved
+# next to the agent state checkpoints, so they reach every worker and survive restarts.
+agent_loader.build_index()
+agent_loader.persist_routes(
+    os.getenv('AGENT_ROUTES_PATH') or os.path.join(agent_state.directory, 'routes.json'),
+    generation=shared_state.counter('agent_routes_generation'),
+)
+if os.getenv('AGENT_LOADER_PREWARM') == '1':
+    for failed_agent, load_error in agent_loader.prewarm().items():
+        print(f"Failed to pre-load agent {failed_agent}: {load_error}")
+
 UPLOAD_FOLDER = '/tmp'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB max file size
 
 ### Helper Functions ###
 
-# Function to send requests to q.idefi.ai/api/ paths
-def send_q_idefi_request(endpoint, params):
-    url = f"{Q_IDEFI_API_URL}/{endpoint}"
+# Function to POST to an upstream service, raising UpstreamUnavailable for failures that count against it
+def post_upstream(service, base_url, endpoint, params, timeout):
+    url = f"{base_url}/{endpoint}"
     headers = {
         "Content-Type": "application/json"
     }
 
-    try:
-        response = requests.post(url, json=params, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        return {"error": str(e)}
+    # Failures are recorded here under their own type and raised once outside, so track_upstream does not count them again
+    with track_upstream(service, endpoint) as observation:
+        try:
+            response = upstream_session.post(url, json=params, headers=headers, timeout=timeout)
+            observation['size'] = len(response.content)
+            response.raise_for_status()
+            return response.json()
+        except requests.HTTPError as e:
+            record_error(f'upstream:{service}', type(e).__name__)
+            # 4xx responses are our mistake, not a sign the upstream is unhealthy
+            if e.response is not None and e.response.status_code < 500:
+                return {"error": str(e)}
+            failure = e
+        except requests.RequestException as e:
+            record_error(f'upstream:{service}', type(e).__name__)
+            failure = e
+    raise UpstreamUnavailable(str(failure))
+
+# Function to send requests to q.idefi.ai/api/ paths
+def send_q_idefi_request(endpoint, params):
+    return upstream_guards["q.idefi.ai"].call(
+        endpoint, params, lambda: post_upstream("q.idefi.ai", Q_IDEFI_API_URL, endpoint, params, Q_IDEFI_TIMEOUT))
 
 # Function to send requests to api.idefi.ai/api/ paths
 def send_idefi_request(endpoint, params):
-    url = f"{IDEFI_API_URL}/{endpoint}"
-    headers = {
-        "Content-Type": "application/json"
-    }
-
+    return upstream_guards["api.idefi.ai"].call(
+        endpoint, params, lambda: post_upstream("api.idefi.ai", IDEFI_API_URL, endpoint, params, IDEFI_TIMEOUT))
+
+# Function to check that an address is a well-formed 0x-prefixed Ethereum address
+def is_valid_eoa(address):
+    if address_key(address) is None:
+        return {"error": f"Invalid Ethereum address: {address}"}
+    return {"valid": True}
+
+# Function to strip, validate and dedupe a list of addresses, keeping their original order
+def clean_and_validate_addresses(addresses):
+    cleaned = []
+    seen = set()
+    for address in addresses:
+        if not isinstance(address, str):
+            continue
+        address = address.strip()
+        normalized = address.lower()
+        if address_key(address) is None or normalized in seen:
+            continue
+        seen.add(normalized)
+        cleaned.append(address)
+    return cleaned
+
+# Function to turn a scheduler rejection into a 429/503 response with Retry-After
+def scheduler_rejection(admission):
+    response = jsonify({"error": admission['error'], "retry_after": admission['retry_after']})
+    response.status_code = admission['status']
+    response.headers['Retry-After'] = str(max(1, int(round(admission['retry_after']))))
+    return response
+
+# Function to check the admin bearer token, returning an error response or None
+def require_admin_token():
+    if not ADDRESS_INDEX_ADMIN_TOKEN:
+        return jsonify({"error": "Address index administration is disabled"}), 403
+    supplied = request.headers.get('Authorization', '')
+    if not supplied.startswith('Bearer ') or not hmac.compare_digest(supplied[7:].encode('utf-8'), ADDRESS_INDEX_ADMIN_TOKEN.encode('utf-8')):
+        return jsonify({"error": "Invalid or missing admin token"}), 401
+    return None
+
+# Function to pick the local quantum memory session for a request, or None to use q.idefi.ai
+def quantum_memory_session(data):
+    session_id = data.get('session_id')
+    if session_id is None and QUANTUM_MEMORY_LOCAL:
+        return 'default'
+    return str(session_id) if session_id is not None else None
+
+# Function to attach the endpoint assigned to an agent for a task (see /api/agents_endpoints) to its payload
+def route_task(agent_type, agent_name, task_data):
+    task = task_data.get('task') if isinstance(task_data, dict) else task_data
+    endpoint = agent_loader.route(TIER_AGENT_TYPES.get(agent_type, agent_type), agent_name, task) if isinstance(task, str) else None
+    if endpoint is None:
+        return task_data
+    if isinstance(task_data, dict):
+        return dict(task_data, endpoint=task_data.get('endpoint') or endpoint)
+    return {"task": task, "endpoint": endpoint, "data": None}
+
+# Function to add a running agent to a tier, checkpoint it and announce it to dashboards
+def register_agent(agent_type, agent_name, agent):
+    agent_instances.setdefault(agent_type, {})[agent_name] = agent
+    agent_state.upsert(agent_type, agent_name)
+    publish_agent_status(agent_type, agent_name)
+
+# Function to push an agent's current status to subscribed dashboards
+def publish_agent_status(agent_type, agent_name):
+    agent = agent_instances.get(agent_type, {}).get(agent_name)
+    if agent is None:
+        return
     try:
-        response = requests.post(url, json=params, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        return {"error": str(e)}
-
-# Send email notification via Firestore-triggered Firebase function
+        status = agent.get_status()
+        status_broadcaster.publish(agent_type, agent_name, status)
+        # Other workers serve status reads and streams from the shared table
+        if not shared_state.put_status(agent_type, agent_name, status):
+            record_error('shared_state', 'status_not_shared')
+    except Exception as e:
+        record_error('status_stream', type(e).__name__)
+
+# Function to collect agent statuses, preferring the latest one any worker published
+def collect_agent_statuses(matches=None):
+    statuses = {}
+    for a_type, agents in agent_instances.items():
+        statuses[a_type] = {name: agent.get_status() for name, agent in list(agents.items())
+                            if matches is None or matches(a_type, name)}
+    for a_type, name, status in shared_state.statuses():
+        if matches is None or matches(a_type, name):
+            statuses.setdefault(a_type, {})[name] = status
+    return statuses
+
+# Queue email notification for the Firestore-triggered Firebase function
 def send_email_notification(to_email, subject, body_html):
-    mail_ref = db.collection('mail').document()
-    mail_ref.set({
-        'to': to_email,
-        'message': {
-            'subject': subject,
-            'html': body_html
-        }
-    })
+    return notification_outbox.enqueue(to_email, subject, body_html)
 
 ### Endpoints ###
 
@@ -126,28 +304,55 @@ def upload_file():
 
     if file and file.filename.endswith(('.csv', '.json')):
         try:
+            # Without a user id there is no history of our own to compare against, so only per-address results are reused
+            user_id = request.form.get('user_id') or request.headers.get('X-User-Id')
+            content = file.read()
+            fingerprint = content_hash(content)
+
+            # An exact repeat of the user's last upload is served from the local results store
+            latest = upload_store.latest_upload(user_id) if user_id else None
+            if latest and latest[0] == fingerprint:
+                previous = upload_store.previous_addresses(user_id)
+                known = upload_store.fresh_results(previous)
+                if len(known) == len(previous):
+                    return jsonify({'details': list(known.values()), 'file_url': latest[1], 'unchanged': True})
+
             # Process the file
             results = []
             data = {}
 
             if file.filename.endswith('.csv'):
-                df = pd.read_csv(file)
-                for index, row in df.iterrows():
-                    data[row['address']] = None  # Extract addresses
+                with track_stage('parse_csv'):
+                    df = pd.read_csv(BytesIO(content), usecols=['address'])
+                    data = dict.fromkeys(df['address'].dropna().astype(str))  # Extract addresses
 
             elif file.filename.endswith('.json'):
-                data = json.load(file)
+                with track_stage('parse_json'):
+                    data = json.loads(content)
 
-            addresses = list(data.keys())
-            addresses = clean_and_validate_addresses(addresses)  # Implement validation logic here
+            addresses = [address.lower() for address in clean_and_validate_addresses(list(data.keys()))]
+            # Upstream gets each address under the key it was uploaded with, along with its value
+            original_keys = {}
+            for key in data:
+                original_keys.setdefault(str(key).strip().lower(), key)
 
-            # Send the data to the external api.idefi.ai for processing
-            response = send_idefi_request('upload', data)
+            # Only addresses without a fresh stored result go upstream
+            known = upload_store.fresh_results(addresses)
+            pending = [address for address in addresses if address not in known]
+            new_addresses = len(set(addresses) - upload_store.previous_addresses(user_id)) if user_id else None
 
-            if 'error' in response:
-                return jsonify({'error': response['error']}), 500
+            if pending:
+                # Send the data to the external api.idefi.ai for processing
+                response = send_idefi_request('upload', {original_keys[address]: data[original_keys[address]] for address in pending})
+
+                if 'error' in response:
+                    return jsonify({'error': response['error']}), 500
 
-            results = response.get('details', [])
+                fetched = response.get('details', [])
+                upload_store.save_results(fetched)
+                known.update({result['address'].lower(): result for result in fetched})
+
+            results = [known[address] for address in addresses if address in known]
 
             # Save results to CSV and upload to Firebase Storage
             csv_content = 'address,status,description\n'
@@ -159,11 +364,16 @@ def upload_file():
             output.seek(0)
             current_date = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
             filename = f"results_{current_date}.csv"
-            blob = bucket.blob(filename)
-            blob.upload_from_file(output, content_type='text/csv')
+            with track_stage('firebase_upload'):
+                blob = bucket.blob(filename)
+                blob.upload_from_file(output, content_type='text/csv')
 
             file_url = blob.public_url
-            return jsonify({'details': results, 'file_url': file_url})
+            if user_id:
+                upload_store.save_upload(user_id, fingerprint, file_url, addresses)
+            return jsonify({'details': results, 'file_url': file_url,
+                            'sent_upstream': len(pending), 'reused': len(addresses) - len(pending),
+                            'new_addresses': new_addresses})
 
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -317,14 +527,18 @@ def generate_explanation_endpoint():
         if not all([risk_scores, histogram_base64, circuit_base64]):
             return jsonify({'error': 'Missing required parameters'}), 400
 
-        # Call q.idefi.ai for explanation generation
+        # Call q.idefi.ai for explanation generation, unless the same inputs were explained before
         params = {
             "risk_scores": risk_scores,
             "histogram_base64": histogram_base64,
             "circuit_base64": circuit_base64
         }
-        response = send_q_idefi_request('generate-explanation', params)
-        return jsonify(response)
+        key = explanation_key(risk_scores, histogram_base64, circuit_base64)
+        response, cache_result = explanation_cache.get_or_generate(
+            key, lambda: send_q_idefi_request('generate-explanation', params))
+        result = jsonify(response)
+        result.headers['X-Cache'] = cache_result
+        return result
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -349,7 +563,12 @@ def compile_and_run():
 # Endpoint to initialize quantum memory
 @app.route("/api/initialize_memory", methods=["POST"])
 def api_initialize_memory():
+    data = request.get_json(silent=True) or {}
+    session_id = quantum_memory_session(data)
     try:
+        if session_id is not None:
+            result = quantum_memory.initialize(session_id)
+            return jsonify({"message": "Quantum memory initialized", "session_id": session_id, "state": result['state']})
         response = send_q_idefi_request('initialize_memory', {})
         return jsonify(response)
     except Exception as e:
@@ -364,7 +583,11 @@ def api_store_in_memory():
     if state not in ['0', '1', '+', '-']:
         return jsonify({"error": "Invalid state. Must be one of '0', '1', '+', '-'"}), 400
 
+    session_id = quantum_memory_session(data)
     try:
+        if session_id is not None:
+            quantum_memory.store(session_id, state)
+            return jsonify({"message": f"State {state} stored in quantum memory", "session_id": session_id, "state": state})
         params = {"state": state}
         response = send_q_idefi_request('store_in_memory', params)
         return jsonify(response)
@@ -374,12 +597,54 @@ def api_store_in_memory():
 # Endpoint to retrieve state from quantum memory
 @app.route("/api/retrieve_from_memory", methods=["POST"])
 def api_retrieve_from_memory():
+    data = request.get_json(silent=True) or {}
+    session_id = quantum_memory_session(data)
     try:
+        if session_id is not None:
+            operation = {"op": "retrieve", "basis": data.get('basis', 'z'), "shots": data.get('shots', 1024)}
+            error = validate_operations([operation])
+            if error:
+                return jsonify({"error": error}), 400
+            result = quantum_memory.run({session_id: [operation]})[session_id][0]
+            return jsonify(dict(result, session_id=session_id))
         response = send_q_idefi_request('retrieve_from_memory', {})
         return jsonify(response)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Endpoint to run a sequence of quantum memory operations for one or many sessions in a single call
+@app.route("/api/quantum_memory_pipeline", methods=["POST"])
+def api_quantum_memory_pipeline():
+    data = request.get_json(silent=True) or {}
+    if 'sessions' in data:
+        programs = data['sessions']
+        if not isinstance(programs, dict) or not programs:
+            return jsonify({"error": "Sessions must map session ids to operation lists"}), 400
+    elif data.get('session_id') is not None:
+        programs = {data['session_id']: data.get('operations')}
+    else:
+        return jsonify({"error": "Either session_id and operations, or sessions, is required"}), 400
+
+    if len(programs) > QUANTUM_MEMORY_MAX_SESSIONS:
+        return jsonify({"error": f"At most {QUANTUM_MEMORY_MAX_SESSIONS} sessions per call"}), 400
+    for session_id, operations in programs.items():
+        error = validate_operations(operations, QUANTUM_MEMORY_MAX_OPERATIONS)
+        if error:
+            return jsonify({"error": f"Session {session_id}: {error}"}), 400
+
+    try:
+        with track_stage('quantum_memory'):
+            results = quantum_memory.run({str(session_id): operations for session_id, operations in programs.items()})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    if 'sessions' in data:
+        return jsonify({"sessions": results})
+    session_id = str(data['session_id'])
+    return jsonify({"session_id": session_id, "results": results[session_id]})
+
 # Endpoint for quantum risk analysis
 @app.route("/api/quantum_risk_analysis", methods=["POST"])
 def quantum_risk_analysis():
@@ -474,12 +739,41 @@ def assign_tasks():
     if agent_name not in agent_instances.get(agent_type, {}):
         return jsonify({"error": "Agent not found"}), 404
 
-    agent = agent_instances[agent_type][agent_name]
-    context = Context(agent)
+    with agent_scheduler.slot(agent_type, agent_name) as admission:
+        if 'error' in admission:
+            return scheduler_rejection(admission)
 
-    result = context.send(agent_name, task_data)
+        agent = agent_instances[agent_type][agent_name]
+        if isinstance(agent, RestoredAgent):
+            try:
+                agent = agent_instances[agent_type][agent_name] = agent.materialize(agent_loader)
+            except Exception as e:
+                return jsonify({"error": f"Failed to restore agent {agent_name}: {str(e)}"}), 500
+        context = Context(agent)
+        task_data = route_task(agent_type, agent_name, task_data)
+
+        agent_state.record_task(agent_type, agent_name, task_data)
+        with track_stage('agent_dispatch'):
+            result = context.send(agent_name, task_data)
+        agent_state.record_result(agent_type, agent_name, result)
+    publish_agent_status(agent_type, agent_name)
     return jsonify({"message": f"Tasks assigned to {agent_name}", "result": result}), 200
 
+# Assign custom endpoints to a generated agent
+@app.route('/api/agents_endpoints', methods=['POST'])
+def assign_endpoints_task():
+    data = request.get_json()
+    agent_name = data.get('agent_name')
+    endpoints = data.get('endpoints')
+
+    if not agent_name or not isinstance(endpoints, dict):
+        return jsonify({"error": "Agent name and an endpoints mapping are required"}), 400
+
+    result = assign_agent_endpoints(agent_name, endpoints, data.get('agent_type'))
+    if 'error' in result:
+        return jsonify(result), 404
+    return jsonify(result), 200
+
 # Get status of a specific agent or all agents
 @app.route('/api/agents_status', methods=['GET'])
 def get_all_agent_status():
@@ -490,14 +784,31 @@ def get_all_agent_status():
         if agent_type not in agent_instances or agent_name not in agent_instances[agent_type]:
             return jsonify({"error": "Agent not found"}), 404
 
-        agent = agent_instances[agent_type][agent_name]
-        status = agent.get_status()
+        status = shared_state.get_status(agent_type, agent_name)
+        if status is None:
+            status = agent_instances[agent_type][agent_name].get_status()
         return jsonify({"status": status})
 
-    all_statuses = {a_type: {name: agent.get_status() for name, agent in agents.items()}
-                    for a_type, agents in agent_instances.items()}
+    return jsonify(collect_agent_statuses())
+
+# Stream agent status changes as server-sent events: one snapshot, then deltas only
+@app.route('/api/agents_status_stream', methods=['GET'])
+def stream_agent_status():
+    agent_types = [a_type for a_type in request.args.get('agent_type', '').split(',') if a_type]
+    agent_names = [name for name in request.args.get('agent_name', '').split(',') if name]
 
-    return jsonify(all_statuses)
+    # Subscribe before taking the snapshot so no update can fall between the two
+    subscriber = status_broadcaster.subscribe(agent_types, agent_names)
+    if subscriber is None:
+        return scheduler_rejection({"error": "Too many open status streams, try again shortly", "status": 503, "retry_after": 5})
+    status_follower.ensure_running()
+    snapshot = {a_type: statuses for a_type, statuses in collect_agent_statuses(subscriber.matches).items() if statuses}
+
+    response = Response(stream_with_context(stream_status_events(status_broadcaster, subscriber, snapshot, max_age=STATUS_STREAM_MAX_AGE)),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 # Endpoint to sync wallet or file data for agent processing
 @app.route('/api/agents_sync', methods=['POST'])
@@ -525,7 +836,8 @@ def sync_data():
                 wallet_addresses = [row[0] for row in reader if row]
 
     context = Context(agent)
-    result = context.send(agent_name, {"task": task, "data": wallet_addresses})
+    with track_stage('agent_dispatch'):
+        result = context.send(agent_name, {"task": task, "data": wallet_addresses})
 
     return jsonify({"message": f"Data synced to agent {agent_name}", "addresses": wallet_addresses, "result": result}), 200
 
@@ -546,19 +858,139 @@ def security_check_task():
     if agent_name not in agent_instances.get("Smart", {}):
         return jsonify({"error": "Agent not found"}), 404
 
-    agent = agent_instances["Smart"][agent_name]
-    context = Context(agent)
+    # Answer from the local index when a fresh verdict exists, skipping the upstream round trip. Such a result
+    # holds the stored verdict (status, risk_score, checked_at, source, cached) rather than the upstream payload.
+    cached_result = address_index.lookup(address)
+    if cached_result is not None:
+        return jsonify({"message": f"Security check performed by {agent_name}", "result": cached_result})
 
-    check_result = send_q_idefi_request('checkaddress', params={'address': address})
+    with agent_scheduler.slot("Smart", agent_name) as admission:
+        if 'error' in admission:
+            return scheduler_rejection(admission)
+
+        agent = agent_instances["Smart"][agent_name]
+        context = Context(agent)
+
+        check_result = send_q_idefi_request('checkaddress', params={'address': address})
     if 'error' in check_result:
         return jsonify({"error": check_result['error']}), 500
 
+    if not check_result.get('stale'):
+        address_index.record(address, check_result)
+    agent_state.record_result("Smart", agent_name, {"task": "security_check", "address": address, "result": check_result})
+    publish_agent_status("Smart", agent_name)
+
     return jsonify({"message": f"Security check performed by {agent_name}", "result": check_result})
 
+# Screen a list or uploaded file of addresses with a Smart agent, streaming verdicts as NDJSON
+@app.route('/api/agents_security_check_bulk', methods=['POST'])
+def bulk_security_check_task():
+    if request.files.get('file'):
+        agent_name = request.form.get('agent_name')
+        try:
+            submitted = read_addresses(request.files['file'])
+        except (ValueError, UnicodeDecodeError) as e:
+            return jsonify({"error": f"Could not read addresses: {str(e)}"}), 400
+    else:
+        data = request.get_json(silent=True) or {}
+        agent_name = data.get('agent_name')
+        submitted = data.get('addresses')
+
+    if not agent_name or not submitted or not isinstance(submitted, list):
+        return jsonify({"error": "Agent name and a list or file of addresses are required"}), 400
+
+    if agent_name not in agent_instances.get("Smart", {}):
+        return jsonify({"error": "Agent not found"}), 404
+
+    rejection = agent_scheduler.check_rate("Smart", agent_name)
+    if rejection is not None:
+        return scheduler_rejection(rejection)
+
+    addresses = clean_and_validate_addresses(submitted)
+    valid_count = sum(1 for address in submitted if address_key(address) is not None)
+    summary = ScreeningSummary(len(submitted), len(submitted) - valid_count, valid_count - len(addresses))
+
+    # Every address that goes upstream is charged to the bulk budget, not the agent's, and queues behind single checks;
+    # the q.idefi.ai guard still bounds how many run at once
+    def check(address):
+        with agent_scheduler.bulk_slot("Smart", agent_name, BULK_SCREENING_WAIT) as admission:
+            if 'error' in admission:
+                return {"error": admission['error']}
+            return send_q_idefi_request('checkaddress', params={'address': address})
+
+    def generate():
+        verdicts = screen_addresses(
+            addresses,
+            lookup=address_index.lookup,
+            check=check,
+            record=address_index.record,
+            concurrency=BULK_SCREENING_CONCURRENCY,
+        )
+        for verdict in verdicts:
+            summary.add(verdict)
+            yield json.dumps({"verdict": verdict}) + '\n'
+        yield json.dumps({"summary": dict(summary.report(), agent_name=agent_name)}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 # Get agent tracking stats
 @app.route('/api/agents_tracking', methods=['GET'])
 def get_agent_tracking():
-    return jsonify(agent_tracking)
+    return jsonify(agent_tracking.to_dict())
+
+# Get load-shedding and circuit breaker status for each upstream
+@app.route('/api/upstream_status', methods=['GET'])
+def get_upstream_status():
+    return jsonify({service: guard.status() for service, guard in upstream_guards.items()})
+
+# Import a blocklist of addresses (one per line, or first CSV column) into the local risk index
+@app.route('/api/address_index_import', methods=['POST'])
+def import_address_blocklist():
+    denied = require_admin_token()
+    if denied:
+        return denied
+
+    uploaded_file = request.files.get('file')
+    if not uploaded_file:
+        return jsonify({"error": "Blocklist file is required"}), 400
+
+    lines = (line.decode('utf-8', errors='ignore') for line in uploaded_file.stream)
+    imported = address_index.import_blocklist(lines)
+    return jsonify({"message": f"Imported {imported} addresses", "indexed_addresses": len(address_index)})
+
+# Remove addresses, blocklisted ones included, from the local risk index so they are checked upstream again
+@app.route('/api/address_index_remove', methods=['POST'])
+def remove_indexed_addresses():
+    denied = require_admin_token()
+    if denied:
+        return denied
+
+    data = request.get_json(silent=True) or {}
+    addresses = data.get('addresses')
+    if not isinstance(addresses, list) or not addresses:
+        return jsonify({"error": "addresses must be a non-empty list"}), 400
+    removed = address_index.remove(addresses)
+    return jsonify({"message": f"Removed {removed} addresses", "indexed_addresses": len(address_index)})
+
+# Get size and hit rates of the local address risk index
+@app.route('/api/address_index_status', methods=['GET'])
+def get_address_index_status():
+    return jsonify(dict(address_index.stats, indexed_addresses=len(address_index)))
+
+# Get size and in-flight generations of the explanation cache
+@app.route('/api/explanation_cache_status', methods=['GET'])
+def get_explanation_cache_status():
+    return jsonify(explanation_cache.status())
+
+# Get the number of active local quantum memory sessions
+@app.route('/api/quantum_memory_status', methods=['GET'])
+def get_quantum_memory_status():
+    return jsonify(quantum_memory.status())
+
+# Get agent scheduler slot usage, queue depth and rejections per tier
+@app.route('/api/agents_scheduler_status', methods=['GET'])
+def get_agent_scheduler_status():
+    return jsonify(agent_scheduler.status())
 
 if __name__ == "__main__":
     app.run(debug=True, host='0.0.0.0', port=5328)
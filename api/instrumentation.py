@@ -0,0 +1,262 @@
+import os
+import io
+import time
+import random
+import bisect
+import pstats
+import cProfile
+import threading
+from collections import deque
+from contextlib import contextmanager
+from flask import Response, g, jsonify, request
+
+# Instrumentation can be switched off entirely, and profiling is opt-in
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+PROFILING_ENABLED = os.getenv('METRICS_PROFILING', '0') == '1'
+PROFILE_SAMPLE_RATE = float(os.getenv('METRICS_PROFILE_SAMPLE_RATE', '0'))
+PROFILE_HISTORY = 20
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            lines.append(f'{self.name}{_format_labels(self.label_names, label_values)} {value}')
+        return lines
+
+
+class Gauge(Counter):
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def collect(self):
+        lines = super().collect()
+        lines[1] = f'# TYPE {self.name} gauge'
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = [(label_values, list(series)) for label_values, series in self._series.items()]
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                labels = _format_labels(self.label_names, label_values, ('le', bound))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f'{self.name}_sum{labels} {series[-2]}')
+            lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+
+### Metrics ###
+
+request_latency = Histogram('idefi_request_duration_seconds', 'Latency of API requests by route.', ('method', 'route', 'status'))
+requests_in_flight = Gauge('idefi_requests_in_flight', 'API requests currently being handled.', ('route',))
+request_size = Histogram('idefi_request_size_bytes', 'Size of API request bodies.', ('route',), SIZE_BUCKETS)
+response_size = Histogram('idefi_response_size_bytes', 'Size of API response bodies.', ('route',), SIZE_BUCKETS)
+
+upstream_latency = Histogram('idefi_upstream_duration_seconds', 'Latency of upstream calls by service and endpoint.', ('service', 'endpoint'))
+upstream_in_flight = Gauge('idefi_upstream_in_flight', 'Upstream calls currently outstanding.', ('service',))
+upstream_response_size = Histogram('idefi_upstream_response_size_bytes', 'Size of upstream response bodies.', ('service', 'endpoint'), SIZE_BUCKETS)
+
+stage_latency = Histogram('idefi_stage_duration_seconds', 'Time spent in internal stages such as Firebase writes or file parsing.', ('stage',))
+errors = Counter('idefi_errors_total', 'Errors by where they happened and exception type.', ('source', 'type'))
+
+registry = [request_latency, requests_in_flight, request_size, response_size,
+            upstream_latency, upstream_in_flight, upstream_response_size,
+            stage_latency, errors]
+
+# Recent profiles, newest last
+profiles = deque(maxlen=PROFILE_HISTORY)
+_profiler_lock = threading.Lock()
+
+
+# Function to render all metrics in the Prometheus text exposition format
+def render_metrics():
+    lines = []
+    for metric in registry:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+# Upstream endpoints can embed identifiers (e.g. download/<filename>), so only the first segment is a label
+def _endpoint_label(endpoint):
+    return endpoint.split('/', 1)[0]
+
+
+@contextmanager
+def track_upstream(service, endpoint):
+    """
+    Times an upstream call and counts it as in flight while it runs.
+
+    Yields a dict; set its "size" key to the response body size to record it.
+    """
+    if not METRICS_ENABLED:
+        yield {}
+        return
+    label = _endpoint_label(endpoint)
+    observation = {}
+    upstream_in_flight.inc(service)
+    start = time.perf_counter()
+    try:
+        yield observation
+    except Exception as e:
+        errors.inc(f'upstream:{service}', type(e).__name__)
+        raise
+    finally:
+        upstream_latency.observe(time.perf_counter() - start, service, label)
+        upstream_in_flight.dec(service)
+        if 'size' in observation:
+            upstream_response_size.observe(observation['size'], service, label)
+
+
+@contextmanager
+def track_stage(stage):
+    """
+    Times an internal stage of request handling, e.g. 'firebase_upload' or 'parse_csv'.
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        errors.inc(f'stage:{stage}', type(e).__name__)
+        raise
+    finally:
+        stage_latency.observe(time.perf_counter() - start, stage)
+
+
+# Function to record an error that was handled rather than raised
+def record_error(source, error_type):
+    if METRICS_ENABLED:
+        errors.inc(source, error_type)
+
+
+def _route_label():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _should_profile():
+    if not PROFILING_ENABLED:
+        return False
+    if request.headers.get('X-Profile') == '1' or request.args.get('profile') == '1':
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _before_request():
+    route = _route_label()
+    g.metrics_route = route
+    g.metrics_start = time.perf_counter()
+    requests_in_flight.inc(route)
+    if request.content_length:
+        request_size.observe(request.content_length, route)
+
+    # Only one request is profiled at a time so concurrent requests are not slowed down together
+    if _should_profile() and _profiler_lock.acquire(blocking=False):
+        g.metrics_profiler = cProfile.Profile()
+        g.metrics_profiler.enable()
+
+
+def _after_request(response):
+    route = getattr(g, 'metrics_route', None)
+    if route is None:
+        return response
+    request_latency.observe(time.perf_counter() - g.metrics_start, request.method, route, str(response.status_code))
+    if response.status_code >= 500:
+        errors.inc(f'route:{route}', f'http_{response.status_code}')
+    if not response.is_streamed and response.content_length is not None:
+        response_size.observe(response.content_length, route)
+    return response
+
+
+def _teardown_request(exception):
+    route = getattr(g, 'metrics_route', None)
+    if route is None:
+        return
+    requests_in_flight.dec(route)
+    if exception is not None:
+        errors.inc(f'route:{route}', type(exception).__name__)
+
+    profiler = getattr(g, 'metrics_profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profiler_lock.release()
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(30)
+        profiles.append({"route": route, "method": request.method, "timestamp": time.time(), "stats": output.getvalue()})
+
+
+def instrument_app(app):
+    """
+    Registers request hooks and the /metrics endpoints on a Flask app.
+
+    Parameters:
+    - app (Flask): The application to instrument.
+    """
+    if METRICS_ENABLED:
+        app.before_request(_before_request)
+        app.after_request(_after_request)
+        app.teardown_request(_teardown_request)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/metrics/profiles', methods=['GET'])
+    def metrics_profiles_endpoint():
+        return jsonify({"enabled": PROFILING_ENABLED, "profiles": list(profiles)})
@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import queue
+import atexit
+import hashlib
+import threading
+from collections import deque
+from api.instrumentation import track_stage
+
+# Firestore rejects write batches with more than 500 operations
+FIRESTORE_MAX_BATCH = 500
+
+# Mail store that writes to the Firestore collection watched by the email Firebase function
+class FirestoreMailStore:
+    def __init__(self, db, collection='mail'):
+        self.db = db
+        self.collection = collection
+
+    def write_batch(self, documents):
+        for start in range(0, len(documents), FIRESTORE_MAX_BATCH):
+            with track_stage('firebase_mail_batch'):
+                batch = self.db.batch()
+                for document in documents[start:start + FIRESTORE_MAX_BATCH]:
+                    batch.set(self.db.collection(self.collection).document(), document)
+                batch.commit()
+
+# Local stand-in mail store that appends one JSON document per line
+class LocalMailStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write_batch(self, documents):
+        lines = ''.join(json.dumps(document) + '\n' for document in documents)
+        with self._lock:
+            with open(self.path, 'a') as file:
+                file.write(lines)
+
+
+class NotificationOutbox:
+    """
+    Bounded in-process queue of email notifications drained by a background worker.
+
+    Enqueueing never touches the mail store: identical notifications inside the dedupe
+    window are dropped, recipients over their rate limit are rejected, and the worker
+    writes the rest to the store in batches, retrying failed batches with backoff.
+    """
+
+    def __init__(self, store, max_queue=10000, batch_size=200, flush_interval=0.5,
+                 max_retries=3, retry_backoff=0.5, dedupe_window=300,
+                 rate_limit=20, rate_window=60):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.dedupe_window = dedupe_window
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._recent = {}  # notification hash -> time it was accepted
+        self._sent_by_recipient = {}  # recipient -> deque of accept times
+        self._last_purge = time.monotonic()
+        self._worker = None
+        self._worker_pid = None
+        self._stopping = threading.Event()
+        self.stats = {"queued": 0, "written": 0, "duplicates": 0, "rate_limited": 0,
+                      "dropped": 0, "failed": 0, "retries": 0}
+
+    def enqueue(self, to_email, subject, body_html):
+        """
+        Queues an email notification for delivery without blocking the caller.
+
+        Parameters:
+        - to_email (str): Recipient address.
+        - subject (str): Email subject line.
+        - body_html (str): HTML body of the email.
+
+        Returns:
+        - dict: {"queued": True} on success, otherwise a "skipped" reason or an error.
+        """
+        now = time.monotonic()
+        key = hashlib.sha1(f"{to_email}\0{subject}\0{body_html}".encode('utf-8')).hexdigest()
+
+        with self._lock:
+            if now - self._last_purge > self.dedupe_window:
+                self._purge(now)
+
+            accepted_at = self._recent.get(key)
+            if accepted_at is not None and now - accepted_at < self.dedupe_window:
+                self.stats["duplicates"] += 1
+                return {"skipped": "duplicate"}
+
+            history = self._sent_by_recipient.setdefault(to_email, deque())
+            while history and now - history[0] >= self.rate_window:
+                history.popleft()
+            if len(history) >= self.rate_limit:
+                self.stats["rate_limited"] += 1
+                return {"skipped": "rate_limited"}
+
+            document = {
+                'to': to_email,
+                'message': {
+                    'subject': subject,
+                    'html': body_html
+                }
+            }
+            try:
+                self._queue.put_nowait(document)
+            except queue.Full:
+                self.stats["dropped"] += 1
+                return {"error": "Notification outbox is full"}
+
+            self._recent[key] = now
+            history.append(now)
+            self.stats["queued"] += 1
+
+        self._ensure_worker()
+        return {"queued": True}
+
+    def flush(self, timeout=None):
+        """
+        Blocks until every queued notification has been written or given up on.
+        """
+        self._ensure_worker()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout=5):
+        if self._worker is not None and self._worker_pid == os.getpid():
+            self.flush(timeout)
+            self._stopping.set()
+            self._worker.join(timeout)
+
+    def _purge(self, now):
+        self._recent = {key: accepted_at for key, accepted_at in self._recent.items()
+                        if now - accepted_at < self.dedupe_window}
+        self._sent_by_recipient = {recipient: history for recipient, history in self._sent_by_recipient.items()
+                                   if history and now - history[-1] < self.rate_window}
+        self._last_purge = now
+
+    # Threads do not survive a fork, so (re)start the worker lazily in whichever process enqueues
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+                return
+            self._stopping.clear()
+            self._worker = threading.Thread(target=self._run, name='notification-outbox', daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+
+            # Give a burst a moment to accumulate so it goes out as one batched write
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._write_with_retries(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_with_retries(self, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.store.write_batch(batch)
+                self.stats["written"] += len(batch)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.stats["failed"] += len(batch)
+                    print(f"Failed to write {len(batch)} email notifications: {str(e)}")
+                    return
+                self.stats["retries"] += 1
+                time.sleep(self.retry_backoff * (2 ** attempt))
+
+
+# Function to build the outbox used by the API, with a local store when MAIL_OUTBOX_PATH is set
+def create_notification_outbox(db):
+    local_path = os.getenv('MAIL_OUTBOX_PATH')
+    store = LocalMailStore(local_path) if local_path else FirestoreMailStore(db)
+    outbox = NotificationOutbox(
+        store,
+        max_queue=int(os.getenv('MAIL_OUTBOX_MAX_QUEUE', 10000)),
+        batch_size=int(os.getenv('MAIL_OUTBOX_BATCH_SIZE', 200)),
+        rate_limit=int(os.getenv('MAIL_OUTBOX_RATE_LIMIT', 20)),
+    )
+    atexit.register(outbox.stop)
+    return outbox
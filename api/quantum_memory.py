@@ -0,0 +1,266 @@
+import os
+import math
+import time
+import hashlib
+import numpy as np
+from api.shared_state import FileLock
+
+MEMORY_MAGIC = 0x314D454D51414649  # "IFAQMEM1"
+HEADER_FIELDS = 4  # magic, capacity, occupied slots, reserved
+
+SESSION_DTYPE = np.dtype([('key', 'u8', (2,)), ('state', 'c16', (2,)), ('used_at', 'f8')])
+
+# Single-qubit states that can be stored, by name
+NAMED_STATES = {
+    '0': np.array([1, 0], dtype=np.complex128),
+    '1': np.array([0, 1], dtype=np.complex128),
+    '+': np.array([1, 1], dtype=np.complex128) / math.sqrt(2),
+    '-': np.array([1, -1], dtype=np.complex128) / math.sqrt(2),
+}
+STATE_NAMES = list(NAMED_STATES)
+STATE_VECTORS = np.stack([NAMED_STATES[name] for name in STATE_NAMES])
+
+# Measurement bases: outcome labels and the basis vectors they project onto
+BASES = {
+    'z': (('0', '1'), np.stack([NAMED_STATES['0'], NAMED_STATES['1']])),
+    'x': (('+', '-'), np.stack([NAMED_STATES['+'], NAMED_STATES['-']])),
+}
+
+OPERATIONS = ('initialize', 'store', 'retrieve')
+DEFAULT_SHOTS = 1024
+MAX_SHOTS = 1000000
+
+
+# Function to derive the 128-bit table key for a session id
+def session_key(session_id):
+    digest = hashlib.blake2b(str(session_id).encode('utf-8'), digest_size=16).digest()
+    key = (int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little'))
+    return key if key != (0, 0) else (1, 0)  # (0, 0) marks an empty slot
+
+
+# Function to check a list of memory operations, returning an error message or None
+def validate_operations(operations, max_operations=1000):
+    if not isinstance(operations, list) or not operations:
+        return "Operations must be a non-empty list"
+    if len(operations) > max_operations:
+        return f"At most {max_operations} operations per session"
+    for position, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            return f"Operation {position}: 'op' must be one of {', '.join(OPERATIONS)}"
+        if operation['op'] == 'store' and operation.get('state') not in NAMED_STATES:
+            return f"Operation {position}: invalid state. Must be one of '0', '1', '+', '-'"
+        if operation['op'] == 'retrieve':
+            if operation.get('basis', 'z') not in BASES:
+                return f"Operation {position}: basis must be 'z' or 'x'"
+            shots = operation.get('shots', DEFAULT_SHOTS)
+            if not isinstance(shots, int) or isinstance(shots, bool) or not 0 <= shots <= MAX_SHOTS:
+                return f"Operation {position}: shots must be an integer between 0 and {MAX_SHOTS}"
+    return None
+
+
+class QuantumMemory:
+    """
+    Local single-qubit quantum memory with one state vector per session.
+
+    Sessions live in a fixed-size open-addressing table of complex amplitudes in a
+    memory-mapped file, so every gunicorn worker sees the same sessions. A batch of
+    programs is run step by step: at each step the operations of every session are applied
+    with array operations, and retrievals compute outcome probabilities and sampled counts
+    for all sessions at once. Retrieval reads the state like a simulator readout and does
+    not collapse it.
+
+    Parameters:
+    - path (str): Table file; created if missing or laid out differently.
+    - capacity (int): Session slots. Least recently used sessions are dropped when they run short;
+      one call may touch at most half of them (max_sessions).
+    - ttl (float): Seconds of inactivity after which a session is discarded.
+    - seed (int): Seed for sampled measurement counts, for reproducible runs. Every process
+      draws the same sequence from it, so gunicorn workers given the same programs sample
+      identical counts; leave it unset in production.
+    """
+
+    def __init__(self, path, capacity=65536, ttl=3600, seed=None):
+        self.path = path
+        self.ttl = ttl
+        self.seed = seed
+        self._lock = FileLock(path + '.lock')
+        self._random = None
+        self._random_pid = None
+
+        table_offset = HEADER_FIELDS * 8
+        with self._lock.hold():
+            header = None
+            if os.path.exists(path) and os.path.getsize(path) >= table_offset:
+                header = np.fromfile(path, dtype='<i8', count=HEADER_FIELDS)
+            if header is not None and header[0] == MEMORY_MAGIC and \
+                    os.path.getsize(path) == table_offset + int(header[1]) * SESSION_DTYPE.itemsize:
+                capacity = int(header[1])
+            else:
+                with open(path, 'wb') as file:
+                    file.truncate(table_offset + capacity * SESSION_DTYPE.itemsize)
+                header = np.memmap(path, dtype='<i8', mode='r+', shape=(HEADER_FIELDS,))
+                header[:] = (MEMORY_MAGIC, capacity, 0, 0)
+                header.flush()
+                del header
+            self.capacity = capacity
+            # A sweep frees the table down to half its slots, so that is all one call can count on
+            self.max_sessions = capacity // 2
+            self._header = np.memmap(path, dtype='<i8', mode='r+', shape=(HEADER_FIELDS,))
+            self._table = np.memmap(path, dtype=SESSION_DTYPE, mode='r+', offset=table_offset, shape=(capacity,))
+
+    ### Session table ###
+
+    def _resolve(self, keys, now):
+        """
+        Finds (or claims) the slot of every key with vectorized linear probing.
+        """
+        table = self._table
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        starts = (keys[:, 0] ^ keys[:, 1]) % np.uint64(self.capacity)
+        pending = np.arange(len(keys))
+        for probe in range(self.capacity):
+            if not len(pending):
+                break
+            slots = ((starts[pending] + np.uint64(probe)) % np.uint64(self.capacity)).astype(np.int64)
+            slot_keys = table['key'][slots]
+            found = (slot_keys == keys[pending]).all(axis=1)
+            empty = (slot_keys == 0).all(axis=1) & ~found
+
+            # Two new sessions can land on the same empty slot; the first claims it, the other keeps probing
+            claimable = np.flatnonzero(empty)
+            _, first = np.unique(slots[claimable], return_index=True)
+            claimed = np.zeros(len(pending), dtype=bool)
+            claimed[claimable[first]] = True
+            if claimed.any():
+                new_slots = slots[claimed]
+                table['key'][new_slots] = keys[pending[claimed]]
+                self._header[2] += int(claimed.sum())
+
+            done = found | claimed
+            rows[pending[done]] = slots[done]
+            pending = pending[~done]
+        if len(pending):
+            raise ValueError("Quantum memory table is full")
+
+        # New sessions, and sessions idle past the TTL, start from |0>
+        expired = rows[table['used_at'][rows] < now - self.ttl]
+        table['state'][expired] = NAMED_STATES['0']
+        table['used_at'][rows] = now
+        return rows
+
+    def _sweep(self, now, incoming):
+        """
+        Once the table would pass 75% use, drops expired sessions, then least recently used
+        ones down to 50%, so rebuilds stay rare.
+        """
+        if self._header[2] + incoming <= self.capacity * 0.75:
+            return
+        table = self._table
+        occupied = ~(table['key'] == 0).all(axis=1)
+        live = np.flatnonzero(occupied & (table['used_at'] >= now - self.ttl))
+        keep = max(0, int(self.capacity * 0.5) - incoming)
+        if len(live) > keep:
+            live = live[np.argsort(table['used_at'][live])[len(live) - keep:]]
+        survivors = np.array(table[live])
+
+        table[:] = np.zeros(1, dtype=SESSION_DTYPE)
+        self._header[2] = 0
+        if len(survivors):
+            rows = self._resolve(survivors['key'], now)
+            table['state'][rows] = survivors['state']
+            table['used_at'][rows] = survivors['used_at']
+
+    ### Programs ###
+
+    def run(self, programs, now=None):
+        """
+        Executes each session's operations in order, all sessions together.
+
+        Parameters:
+        - programs (dict): {session_id: [operation, ...]}; validate with validate_operations() first.
+
+        Returns:
+        - dict: {session_id: [result, ...]} with one result per operation.
+
+        Raises:
+        - ValueError: More sessions than max_sessions.
+        """
+        now = now or time.time()
+        session_ids = list(programs)
+        if len(session_ids) > self.max_sessions:
+            raise ValueError(f"At most {self.max_sessions} sessions per call")
+        keys = np.array([session_key(session_id) for session_id in session_ids], dtype=np.uint64).reshape(-1, 2)
+        results = {session_id: [] for session_id in session_ids}
+
+        # Unseeded generators are created per process, as workers forked from one master would
+        # otherwise share the entropy drawn before the fork; a fixed seed is shared on purpose
+        if self._random_pid != os.getpid():
+            self._random = np.random.default_rng(self.seed)
+            self._random_pid = os.getpid()
+
+        with self._lock.hold():
+            self._sweep(now, len(keys))
+            rows = self._resolve(keys, now)
+            states = self._table['state']
+            for step in range(max(len(operations) for operations in programs.values())):
+                active = [(index, programs[session_id][step]) for index, session_id in enumerate(session_ids)
+                          if step < len(programs[session_id])]
+
+                # initialize and store overwrite the state with a named vector
+                writes = [(index, '0' if operation['op'] == 'initialize' else operation['state'])
+                          for index, operation in active if operation['op'] != 'retrieve']
+                if writes:
+                    indexes = np.array([index for index, _ in writes])
+                    codes = np.array([STATE_NAMES.index(name) for _, name in writes])
+                    states[rows[indexes]] = STATE_VECTORS[codes]
+                    for index, name in writes:
+                        results[session_ids[index]].append({"op": programs[session_ids[index]][step]['op'], "state": name})
+
+                for basis, (labels, vectors) in BASES.items():
+                    reads = [(index, operation) for index, operation in active
+                             if operation['op'] == 'retrieve' and operation.get('basis', 'z') == basis]
+                    if not reads:
+                        continue
+                    indexes = np.array([index for index, _ in reads])
+                    shots = np.array([operation.get('shots', DEFAULT_SHOTS) for _, operation in reads])
+                    probabilities = np.abs(states[rows[indexes]] @ vectors.conj().T) ** 2
+                    probabilities /= probabilities.sum(axis=1, keepdims=True)
+                    second_counts = self._random.binomial(shots, probabilities[:, 1])
+                    for position, (index, _) in enumerate(reads):
+                        first, second = probabilities[position]
+                        result = {
+                            "op": "retrieve",
+                            "basis": basis,
+                            # Named only when the stored state is a basis state of the measurement
+                            "state": labels[0] if first > 1 - 1e-9 else labels[1] if second > 1 - 1e-9 else None,
+                            "probabilities": {labels[0]: round(float(first), 12), labels[1]: round(float(second), 12)},
+                            "shots": int(shots[position]),
+                        }
+                        if shots[position]:
+                            result["counts"] = {labels[0]: int(shots[position] - second_counts[position]),
+                                                labels[1]: int(second_counts[position])}
+                        results[session_ids[index]].append(result)
+        return results
+
+    def initialize(self, session_id):
+        return self.run({session_id: [{"op": "initialize"}]})[session_id][0]
+
+    def store(self, session_id, state):
+        return self.run({session_id: [{"op": "store", "state": state}]})[session_id][0]
+
+    def retrieve(self, session_id, basis='z', shots=DEFAULT_SHOTS):
+        return self.run({session_id: [{"op": "retrieve", "basis": basis, "shots": shots}]})[session_id][0]
+
+    def status(self):
+        return {"sessions": int(self._header[2]), "capacity": self.capacity, "ttl": self.ttl}
+
+
+# Function to build the engine used by the API next to the shared-state segment, so all workers share it
+def create_quantum_memory(shared_state):
+    seed = os.getenv('QUANTUM_MEMORY_SEED')
+    return QuantumMemory(
+        os.getenv('QUANTUM_MEMORY_PATH') or shared_state.path + '.qmem',
+        capacity=int(os.getenv('QUANTUM_MEMORY_SESSIONS', 65536)),
+        ttl=float(os.getenv('QUANTUM_MEMORY_TTL', 3600)),
+        seed=int(seed) if seed is not None else None,
+    )
@@ -0,0 +1,237 @@
+import json
+import time
+import threading
+from collections import OrderedDict, deque
+from api.instrumentation import Counter, Gauge, registry
+
+# Breaker states
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Tickets returned by CircuitBreaker.allow() and passed back to record()
+CALL = 'call'
+PROBE = 'probe'
+
+upstream_concurrency_limit = Gauge('idefi_upstream_concurrency_limit', 'Current adaptive concurrency limit per upstream.', ('service',))
+upstream_circuit_open = Gauge('idefi_upstream_circuit_open', 'Whether the upstream circuit breaker is open (1) or not (0).', ('service',))
+upstream_shed = Counter('idefi_upstream_shed_total', 'Upstream calls rejected without being sent.', ('service', 'reason'))
+upstream_stale_served = Counter('idefi_upstream_stale_served_total', 'Stale cached responses served in place of an upstream call.', ('service',))
+registry.extend([upstream_concurrency_limit, upstream_circuit_open, upstream_shed, upstream_stale_served])
+
+
+class UpstreamUnavailable(Exception):
+    """
+    Raised by a fetch function when the upstream failed in a way that should count against it.
+    """
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit driven by observed latency.
+
+    Each fast success adds 1/limit (about one slot per round trip's worth of calls). A
+    failure, or a call slower than `latency_tolerance` times the baseline latency,
+    multiplies the limit by `backoff`. The baseline is a slow EWMA of successful latencies;
+    calls faster than `latency_floor` are never treated as slow.
+    """
+
+    def __init__(self, initial=16, minimum=2, maximum=64, backoff=0.75, latency_tolerance=2.0, latency_floor=0.05, smoothing=0.05):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.latency_floor = latency_floor
+        self.smoothing = smoothing
+        self.baseline = None
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, latency, success):
+        with self._condition:
+            self.in_flight -= 1
+            if success and self.baseline is None:
+                self.baseline = latency
+            slow = success and latency > max(self.baseline * self.latency_tolerance, self.latency_floor)
+            if success and not slow:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            else:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+            if success:
+                self.baseline += self.smoothing * (latency - self.baseline)
+            self._condition.notify()
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` failures among the last `window` calls, fails fast for
+    `reset_timeout` seconds, then lets a single probe call through to decide whether to close.
+
+    allow() returns a ticket (CALL or PROBE, or None when the call is refused) that the caller
+    passes back to record(). Only the probe's outcome decides a half-open breaker; calls that
+    started while it was closed and finish later are ignored.
+    """
+
+    def __init__(self, failure_threshold=5, window=20, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.opened_at = None
+        self._outcomes = deque(maxlen=window)
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return CALL
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return PROBE
+            return None
+
+    def record(self, success, ticket=CALL):
+        with self._lock:
+            if ticket == PROBE:
+                self._probe_in_flight = False
+                if success:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                else:
+                    self.state = OPEN
+                    self.opened_at = time.monotonic()
+                return
+            if self.state != CLOSED:
+                return
+            self._outcomes.append(success)
+            if self._outcomes.count(False) >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+
+class StaleCache:
+    """
+    Bounded LRU of the last good response per (endpoint, params), used only as a fallback.
+    """
+
+    def __init__(self, max_entries=2048, max_age=3600):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(endpoint, params):
+        return endpoint + '\0' + json.dumps(params, sort_keys=True, default=str)
+
+    def put(self, key, response):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.max_age:
+            return None
+        return entry
+
+
+class UpstreamGuard:
+    """
+    Bulkhead, adaptive limit, circuit breaker and stale fallback for one upstream service.
+
+    Parameters:
+    - service (str): Name used in metrics and the status endpoint (e.g. "q.idefi.ai").
+    - cacheable_endpoints (set): Read-only endpoints whose last good response may be served stale.
+    - queue_timeout (float): Seconds a caller may wait for a concurrency slot before being shed.
+    """
+
+    def __init__(self, service, cacheable_endpoints=(), queue_timeout=0.5, limiter=None, breaker=None, stale_cache=None):
+        self.service = service
+        self.cacheable_endpoints = set(cacheable_endpoints)
+        self.queue_timeout = queue_timeout
+        self.limiter = limiter or AdaptiveLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.stale_cache = stale_cache or StaleCache()
+        self.shed_counts = {"circuit_open": 0, "overloaded": 0}
+        self.stale_served = 0
+        upstream_concurrency_limit.set(int(self.limiter.limit), self.service)
+
+    def call(self, endpoint, params, fetch):
+        """
+        Runs fetch() under this upstream's protections.
+
+        fetch() returns the parsed response, or raises UpstreamUnavailable for failures that
+        count against the upstream. Any other exception propagates to the caller.
+
+        Returns:
+        - dict: The upstream response, a stale cached response marked "stale", or an error.
+        """
+        cache_key = StaleCache.key(endpoint, params) if endpoint.split('/', 1)[0] in self.cacheable_endpoints else None
+
+        ticket = self.breaker.allow()
+        if ticket is None:
+            return self._shed('circuit_open', cache_key, f"{self.service} is unavailable (circuit open)")
+        if not self.limiter.acquire(self.queue_timeout):
+            # A probe that could not get a slot must not leave the breaker stuck half-open
+            if ticket == PROBE:
+                self.breaker.record(False, ticket)
+            return self._shed('overloaded', cache_key, f"{self.service} is overloaded, request shed")
+
+        start = time.monotonic()
+        success = False
+        try:
+            response = fetch()
+            success = True
+        except UpstreamUnavailable as e:
+            response = self._fallback(cache_key, str(e))
+        finally:
+            self.limiter.release(time.monotonic() - start, success)
+            self.breaker.record(success, ticket)
+            upstream_concurrency_limit.set(int(self.limiter.limit), self.service)
+            upstream_circuit_open.set(int(self.breaker.state == OPEN), self.service)
+
+        if success and cache_key is not None and isinstance(response, dict) and 'error' not in response:
+            self.stale_cache.put(cache_key, response)
+        return response
+
+    def _shed(self, reason, cache_key, message):
+        self.shed_counts[reason] += 1
+        upstream_shed.inc(self.service, reason)
+        return self._fallback(cache_key, message)
+
+    def _fallback(self, cache_key, message):
+        entry = self.stale_cache.get(cache_key) if cache_key is not None else None
+        if entry is None:
+            return {"error": message}
+        self.stale_served += 1
+        upstream_stale_served.inc(self.service)
+        cached_at, response = entry
+        return dict(response, stale=True, stale_age_seconds=round(time.monotonic() - cached_at, 1))
+
+    def status(self):
+        return {
+            "circuit": self.breaker.state,
+            "concurrency_limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+            "baseline_latency_ms": round(self.limiter.baseline * 1000, 1) if self.limiter.baseline is not None else None,
+            "shed": dict(self.shed_counts),
+            "stale_served": self.stale_served,
+        }
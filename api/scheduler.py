@@ -0,0 +1,281 @@
+import os
+import time
+import heapq
+import sqlite3
+import itertools
+import threading
+from contextlib import contextmanager
+
+# Rate limits and fair-queuing weights per agent tier. Rates are requests per second.
+TIER_POLICIES = {
+    "Free": {"rate": 5, "burst": 10, "agent_rate": 1, "agent_burst": 3, "weight": 1, "max_waiting": 8},
+    "Standard": {"rate": 20, "burst": 40, "agent_rate": 4, "agent_burst": 8, "weight": 2, "max_waiting": 32},
+    "Smart": {"rate": 50, "burst": 100, "agent_rate": 10, "agent_burst": 20, "weight": 4, "max_waiting": 64},
+    "Quantum": {"rate": 50, "burst": 100, "agent_rate": 10, "agent_burst": 20, "weight": 8, "max_waiting": 64},
+}
+
+# Fair-queuing class of bulk screening checks: below every tier, so interactive requests are admitted first.
+# Bulk checks draw on their own bucket, sized to what the upstream can absorb, never on the tier or agent buckets.
+BULK_QUEUE = "bulk"
+BULK_POLICY = {"rate": 100, "burst": 200, "weight": 0.5, "max_waiting": 256}
+
+
+class InMemoryBucketBackend:
+    """
+    Token buckets held in this process only.
+    """
+
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, buckets, now):
+        """
+        Takes one token from each bucket, or none if any of them is empty.
+
+        Parameters:
+        - buckets (list): (key, rate, burst) for every bucket the request is charged to.
+
+        Returns:
+        - float: 0 if the tokens were taken, otherwise seconds until all buckets have one.
+        """
+        with self._lock:
+            refilled = []
+            for key, rate, burst in buckets:
+                tokens, updated_at = self._buckets.get(key, (burst, now))
+                refilled.append((key, rate, min(burst, tokens + (now - updated_at) * rate)))
+            wait = max([(1 - tokens) / rate for _, rate, tokens in refilled if tokens < 1], default=0.0)
+            for key, _, tokens in refilled:
+                self._buckets[key] = (tokens if wait else tokens - 1, now)
+            return wait
+
+
+class SqliteBucketBackend:
+    """
+    Token buckets in a local SQLite file, shared by every worker process on the host.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated_at REAL)")
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def take(self, buckets, now):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            refilled = []
+            for key, rate, burst in buckets:
+                row = connection.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens, updated_at = row if row else (burst, now)
+                refilled.append((key, rate, min(burst, tokens + max(0.0, now - updated_at) * rate)))
+            wait = max([(1 - tokens) / rate for _, rate, tokens in refilled if tokens < 1], default=0.0)
+            connection.executemany("INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                                   [(key, tokens if wait else tokens - 1, now) for key, _, tokens in refilled])
+            connection.execute("COMMIT")
+            return wait
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+
+class FairScheduler:
+    """
+    Weighted fair queuing over a fixed number of execution slots.
+
+    Each waiting request gets a virtual finish tag of max(virtual time, tier's last tag) + 1/weight,
+    and free slots go to the smallest tag. Under contention a tier with weight 8 is admitted
+    eight times as often as a tier with weight 1; without contention everyone runs immediately.
+    """
+
+    def __init__(self, slots, weights):
+        self.slots = slots
+        self.weights = weights
+        self.in_use = 0
+        self.virtual_time = 0.0
+        self._last_tag = {}
+        self._waiting = []  # heap of [tag, sequence, tier, cancelled]
+        self._waiting_by_tier = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def acquire(self, tier, timeout, max_waiting):
+        with self._condition:
+            self._drop_cancelled()
+            if not self._waiting and self.in_use < self.slots:
+                self.in_use += 1
+                return True
+            if self._waiting_by_tier.get(tier, 0) >= max_waiting:
+                return False
+
+            tag = max(self.virtual_time, self._last_tag.get(tier, 0.0)) + 1.0 / self.weights.get(tier, 1)
+            self._last_tag[tier] = tag
+            entry = [tag, next(self._sequence), tier, False]
+            heapq.heappush(self._waiting, entry)
+            self._waiting_by_tier[tier] = self._waiting_by_tier.get(tier, 0) + 1
+
+            deadline = time.monotonic() + timeout
+            while True:
+                self._drop_cancelled()
+                if self._waiting[0] is entry and self.in_use < self.slots:
+                    heapq.heappop(self._waiting)
+                    self._waiting_by_tier[tier] -= 1
+                    self.virtual_time = tag
+                    self.in_use += 1
+                    # The next waiter may also fit if more than one slot is free
+                    self._condition.notify_all()
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    entry[3] = True
+                    self._waiting_by_tier[tier] -= 1
+                    self._condition.notify_all()
+                    return False
+                self._condition.wait(remaining)
+
+    def release(self):
+        with self._condition:
+            self.in_use -= 1
+            self._condition.notify_all()
+
+    def _drop_cancelled(self):
+        while self._waiting and self._waiting[0][3]:
+            heapq.heappop(self._waiting)
+
+    def snapshot(self):
+        with self._condition:
+            return {"slots": self.slots, "in_use": self.in_use,
+                    "waiting": {tier: count for tier, count in self._waiting_by_tier.items() if count}}
+
+
+class AgentScheduler:
+    """
+    Admission control for agent endpoints: token buckets per tier and per agent, then a fair
+    share of the execution slots weighted by tier.
+
+    Parameters:
+    - slots (int): Agent requests that may run at once.
+    - queue_timeout (float): Seconds a request may wait for a slot before being rejected.
+    - backend: Token bucket backend; in-memory by default.
+    - bulk_policy (dict): Rate, burst, weight and queue length shared by every bulk screening job.
+    """
+
+    def __init__(self, slots=16, queue_timeout=2.0, backend=None, policies=TIER_POLICIES, bulk_policy=BULK_POLICY):
+        self.policies = policies
+        self.bulk_policy = bulk_policy
+        self.queue_timeout = queue_timeout
+        self.backend = backend or InMemoryBucketBackend()
+        weights = {tier: policy["weight"] for tier, policy in policies.items()}
+        self.fair = FairScheduler(slots, dict(weights, **{BULK_QUEUE: bulk_policy["weight"]}))
+        self.rejected = {tier: {"rate_limited": 0, "busy": 0} for tier in policies}
+        self._rejected_lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, tier, agent_name):
+        """
+        Holds an execution slot for one agent request.
+
+        Yields:
+        - dict: {"admitted": True}, or an error with an HTTP status and optional retry_after.
+        """
+        tier = tier if tier in self.policies else "Free"
+        yield from self._admit(tier, self._buckets(tier, agent_name), tier, self.policies[tier]["max_waiting"],
+                               self.queue_timeout, 0)
+
+    @contextmanager
+    def bulk_slot(self, tier, agent_name, timeout):
+        """
+        Holds an execution slot for one upstream check of a bulk job.
+
+        The check is charged to the bulk bucket shared by all jobs, so a job leaves the agent's
+        interactive budget alone; it waits up to `timeout` seconds for a token and queues behind
+        requests of every tier for the slot. The agent is only used for rejection counts.
+
+        Yields:
+        - dict: {"admitted": True}, or an error with an HTTP status and optional retry_after.
+        """
+        tier = tier if tier in self.policies else "Free"
+        bucket = (BULK_QUEUE, self.bulk_policy["rate"], self.bulk_policy["burst"])
+        yield from self._admit(tier, [bucket], BULK_QUEUE, self.bulk_policy["max_waiting"], timeout, timeout)
+
+    def _buckets(self, tier, agent_name):
+        policy = self.policies[tier]
+        return [
+            (f"tier:{tier}", policy["rate"], policy["burst"]),
+            (f"agent:{tier}:{agent_name}", policy["agent_rate"], policy["agent_burst"]),
+        ]
+
+    def _admit(self, tier, buckets, queue, max_waiting, queue_timeout, rate_timeout):
+        rejection = self._take(tier, buckets, rate_timeout)
+        if rejection is not None:
+            yield rejection
+            return
+
+        if not self.fair.acquire(queue, queue_timeout, max_waiting):
+            self._reject(tier, "busy")
+            yield {"error": "Agent scheduler is busy, try again shortly", "status": 503, "retry_after": self.queue_timeout}
+            return
+
+        try:
+            yield {"admitted": True}
+        finally:
+            self.fair.release()
+
+    def check_rate(self, tier, agent_name, timeout=0):
+        """
+        Takes a token from the tier and agent buckets without waiting for an execution slot.
+        A rejected request takes from neither, so one agent over its limit cannot drain its tier.
+
+        Parameters:
+        - timeout (float): Seconds to wait for tokens before rejecting; 0 rejects at once.
+
+        Returns:
+        - dict or None: A 429 rejection, or None if the request is within its limits.
+        """
+        tier = tier if tier in self.policies else "Free"
+        return self._take(tier, self._buckets(tier, agent_name), timeout)
+
+    def _take(self, tier, buckets, timeout):
+        deadline = time.monotonic() + timeout
+
+        wait = self.backend.take(buckets, time.time())
+        while wait and time.monotonic() + wait <= deadline:
+            time.sleep(wait)
+            wait = self.backend.take(buckets, time.time())
+        if wait:
+            self._reject(tier, "rate_limited")
+            return {"error": f"Rate limit exceeded for {tier} tier", "status": 429, "retry_after": round(wait, 3)}
+        return None
+
+    def _reject(self, tier, reason):
+        with self._rejected_lock:
+            self.rejected[tier][reason] += 1
+
+    def status(self):
+        with self._rejected_lock:
+            rejected = {tier: dict(counts) for tier, counts in self.rejected.items()}
+        return dict(self.fair.snapshot(), rejected=rejected)
+
+
+# Function to build the scheduler used by the API; its buckets are shared across workers when AGENT_SCHEDULER_DB is set,
+# which gunicorn.conf.py does by default
+def create_agent_scheduler():
+    path = os.getenv('AGENT_SCHEDULER_DB')
+    backend = SqliteBucketBackend(path) if path else InMemoryBucketBackend()
+    bulk_rate = float(os.getenv('BULK_SCREENING_RATE', BULK_POLICY["rate"]))
+    return AgentScheduler(
+        slots=int(os.getenv('AGENT_SCHEDULER_SLOTS', 16)),
+        queue_timeout=float(os.getenv('AGENT_SCHEDULER_QUEUE_TIMEOUT', 2.0)),
+        backend=backend,
+        bulk_policy=dict(BULK_POLICY, rate=bulk_rate, burst=float(os.getenv('BULK_SCREENING_BURST', bulk_rate * 2))),
+    )
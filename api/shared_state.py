@@ -0,0 +1,316 @@
+import os
+import glob
+import json
+import mmap
+import time
+import zlib
+import fcntl
+import atexit
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+
+SHARED_MAGIC = b'IDFASHM1'
+HEADER = struct.Struct('<8sQII')  # magic, status version, counter slots, status slots
+COUNTER_ENTRY = struct.Struct('<48sq')  # counter name, value
+STATUS_HEADER = struct.Struct('<QIHI')  # version, writer pid, key length, payload length
+
+STATUS_KEY_LIMIT = 128
+VERSION_OFFSET = 8
+
+
+class FileLock:
+    """
+    flock-based lock that excludes other processes and other threads of this one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._file = None
+        self._pid = None
+
+    @contextmanager
+    def hold(self, shared=False):
+        # flock does not exclude threads sharing one file description, so pair it with a thread lock
+        with self._thread_lock:
+            # Forked workers would share an inherited descriptor's lock, so each process opens its own
+            if self._pid != os.getpid():
+                self._file = open(self.path, 'a+')
+                self._pid = os.getpid()
+            fcntl.flock(self._file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+
+class SharedCounter:
+    """
+    One named 64-bit counter in the shared segment. Reads are lock-free.
+    """
+
+    def __init__(self, state, offset):
+        self.state = state
+        self.offset = offset + 48
+
+    @property
+    def value(self):
+        return struct.unpack_from('<q', self.state._map, self.offset)[0]
+
+    def set(self, value):
+        with self.state.locked():
+            struct.pack_into('<q', self.state._map, self.offset, value)
+
+    def increment(self, amount=1):
+        with self.state.locked():
+            value = struct.unpack_from('<q', self.state._map, self.offset)[0] + amount
+            struct.pack_into('<q', self.state._map, self.offset, value)
+            return value
+
+
+class SharedCounterMap:
+    """
+    Fixed set of shared counters read and updated like a dictionary of integers.
+    """
+
+    def __init__(self, state, names):
+        self.counters = {name: state.counter(name) for name in names}
+
+    def __getitem__(self, name):
+        return self.counters[name].value
+
+    def increment(self, name, amount=1):
+        return self.counters[name].increment(amount)
+
+    def to_dict(self):
+        return {name: counter.value for name, counter in self.counters.items()}
+
+
+class SharedState:
+    """
+    Memory-mapped segment shared by every worker process of the API.
+
+    It holds named counters and a table of the last published status of each agent. The
+    file lives in /dev/shm by default, so it is plain shared memory, and workers forked
+    from a preloading master or started independently all attach to the same pages.
+    Writers take an flock on a side lock file; counter reads need no lock.
+
+    Parameters:
+    - path (str): Segment file; created and sized if it does not exist yet.
+    - counter_slots (int): Maximum number of named counters.
+    - status_slots (int): Maximum number of agents in the status table.
+    - status_slot_size (int): Bytes per agent, including its key and JSON status.
+    """
+
+    def __init__(self, path, counter_slots=64, status_slots=2048, status_slot_size=4096, reset=False):
+        self.path = path
+        self._file_lock = FileLock(path + '.lock')
+        self._counter_handles = {}
+
+        with self.locked():
+            existing = None
+            if not reset and os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+                with open(path, 'rb') as file:
+                    existing = HEADER.unpack(file.read(HEADER.size))
+            if existing and existing[0] == SHARED_MAGIC:
+                # Attach using the layout the segment was created with
+                _, _, counter_slots, status_slots = existing
+            else:
+                size = HEADER.size + counter_slots * COUNTER_ENTRY.size + status_slots * status_slot_size
+                with open(path, 'wb') as file:
+                    file.truncate(size)
+                    file.write(HEADER.pack(SHARED_MAGIC, 0, counter_slots, status_slots))
+
+            self.counter_slots = counter_slots
+            self.status_slots = status_slots
+            self._counters_offset = HEADER.size
+            self._status_offset = HEADER.size + counter_slots * COUNTER_ENTRY.size
+            with open(path, 'r+b') as file:
+                self._map = mmap.mmap(file.fileno(), 0)
+            self.status_slot_size = (len(self._map) - self._status_offset) // status_slots
+
+    def locked(self, shared=False):
+        return self._file_lock.hold(shared)
+
+    ### Counters ###
+
+    def counter(self, name):
+        """
+        Returns the shared counter with this name, allocating a slot on first use.
+
+        Raises:
+        - ValueError: The name is too long or every counter slot is taken.
+        """
+        handle = self._counter_handles.get(name)
+        if handle is not None:
+            return handle
+        encoded = name.encode('utf-8')
+        if len(encoded) > 48:
+            raise ValueError(f"Counter name too long: {name}")
+
+        with self.locked():
+            for slot in range(self.counter_slots):
+                offset = self._counters_offset + slot * COUNTER_ENTRY.size
+                slot_name, _ = COUNTER_ENTRY.unpack_from(self._map, offset)
+                slot_name = slot_name.rstrip(b'\0')
+                if slot_name == encoded:
+                    break
+                if not slot_name:
+                    COUNTER_ENTRY.pack_into(self._map, offset, encoded, 0)
+                    break
+            else:
+                raise ValueError("No free shared counter slots")
+        handle = self._counter_handles[name] = SharedCounter(self, offset)
+        return handle
+
+    def counter_map(self, names):
+        return SharedCounterMap(self, names)
+
+    ### Agent statuses ###
+
+    @property
+    def status_version(self):
+        return struct.unpack_from('<Q', self._map, VERSION_OFFSET)[0]
+
+    def _find_slot(self, key):
+        # Linear probing from a hash that is stable across processes
+        start = zlib.crc32(key) % self.status_slots
+        for probe in range(self.status_slots):
+            offset = self._status_offset + ((start + probe) % self.status_slots) * self.status_slot_size
+            _, _, key_length, _ = STATUS_HEADER.unpack_from(self._map, offset)
+            key_start = offset + STATUS_HEADER.size
+            if key_length == 0 or self._map[key_start:key_start + key_length] == key:
+                return offset, key_length == 0
+        return None, False
+
+    def put_status(self, tier, name, status):
+        """
+        Publishes an agent's status to every worker.
+
+        Returns:
+        - bool: False when the status does not fit in a slot or the table is full.
+        """
+        key = f"{tier}/{name}".encode('utf-8')
+        payload = json.dumps(status, separators=(',', ':'), default=str).encode('utf-8')
+        if len(key) > STATUS_KEY_LIMIT or STATUS_HEADER.size + len(key) + len(payload) > self.status_slot_size:
+            return False
+
+        with self.locked():
+            offset, _ = self._find_slot(key)
+            if offset is None:
+                return False
+            version = self.status_version + 1
+            key_start = offset + STATUS_HEADER.size
+            self._map[key_start:key_start + len(key)] = key
+            self._map[key_start + len(key):key_start + len(key) + len(payload)] = payload
+            STATUS_HEADER.pack_into(self._map, offset, version, os.getpid(), len(key), len(payload))
+            struct.pack_into('<Q', self._map, VERSION_OFFSET, version)
+        return True
+
+    def get_status(self, tier, name):
+        key = f"{tier}/{name}".encode('utf-8')
+        with self.locked(shared=True):
+            offset, empty = self._find_slot(key)
+            if offset is None or empty:
+                return None
+            _, _, key_length, payload_length = STATUS_HEADER.unpack_from(self._map, offset)
+            payload_start = offset + STATUS_HEADER.size + key_length
+            return json.loads(self._map[payload_start:payload_start + payload_length])
+
+    def changed_statuses(self, since=0, exclude_pid=None):
+        """
+        Returns statuses published after a status version, optionally skipping one writer's.
+
+        Returns:
+        - tuple: (current version, list of (tier, name, status)).
+        """
+        changed = []
+        with self.locked(shared=True):
+            version = self.status_version
+            if version <= since:
+                return version, changed
+            for slot in range(self.status_slots):
+                offset = self._status_offset + slot * self.status_slot_size
+                slot_version, writer_pid, key_length, payload_length = STATUS_HEADER.unpack_from(self._map, offset)
+                if key_length == 0 or slot_version <= since or writer_pid == exclude_pid:
+                    continue
+                key_start = offset + STATUS_HEADER.size
+                payload_start = key_start + key_length
+                tier, name = self._map[key_start:payload_start].decode('utf-8').split('/', 1)
+                changed.append((tier, name, self._map[payload_start:payload_start + payload_length]))
+        return version, [(tier, name, json.loads(payload)) for tier, name, payload in changed]
+
+    def statuses(self):
+        return self.changed_statuses()[1]
+
+
+class SharedStatusFollower:
+    """
+    Republishes statuses written by other workers to this worker's status broadcaster.
+
+    The thread starts with the first stream subscriber and polls one shared version number,
+    so it costs nothing until another worker actually publishes.
+    """
+
+    def __init__(self, state, broadcaster, interval=0.2):
+        self.state = state
+        self.broadcaster = broadcaster
+        self.interval = interval
+        self._version = state.status_version
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+    def ensure_running(self):
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+                return
+            self._version = self.state.status_version
+            self._worker = threading.Thread(target=self._run, name='shared-status-follower', daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if self.state.status_version == self._version:
+                continue
+            try:
+                self._version, changed = self.state.changed_statuses(self._version, exclude_pid=os.getpid())
+                for tier, name, status in changed:
+                    self.broadcaster.publish(tier, name, status)
+            except Exception as e:
+                print(f"Shared status follower failed: {str(e)}")
+
+
+# Function to attach to the segment created by the gunicorn master, or create a private one for a single process
+def create_shared_state():
+    path = os.getenv('SHARED_STATE_PATH')
+    if path:
+        return SharedState(path)
+
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    path = os.path.join(directory, f"idefi_state_{os.getpid()}")
+    state = SharedState(
+        path,
+        status_slots=int(os.getenv('SHARED_STATUS_SLOTS', 2048)),
+        status_slot_size=int(os.getenv('SHARED_STATUS_SLOT_SIZE', 4096)),
+        reset=True,
+    )
+    atexit.register(remove_shared_state, path, os.getpid())
+    return state
+
+
+# Function to delete a segment file and its companion files (path.*); forked children leave their parent's segment alone
+def remove_shared_state(path, owner_pid=None):
+    if owner_pid is not None and owner_pid != os.getpid():
+        return
+    for leftover in [path] + glob.glob(glob.escape(path) + '.*'):
+        try:
+            os.remove(leftover)
+        except OSError:
+            pass
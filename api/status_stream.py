@@ -0,0 +1,171 @@
+import json
+import time
+import random
+import weakref
+import threading
+
+# Every broadcaster in this process, so a worker that begins shutting down can end its streams
+_broadcasters = weakref.WeakSet()
+
+
+class StatusSubscriber:
+    """
+    One connected dashboard: its filters and the coalesced updates waiting to be sent.
+    """
+
+    def __init__(self, tiers=None, agent_names=None):
+        self.tiers = set(tiers) if tiers else None
+        self.agent_names = set(agent_names) if agent_names else None
+        self._pending = {}  # (tier, name) -> latest status; newer updates overwrite older ones
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self.closed = False
+
+    def matches(self, tier, name):
+        return (self.tiers is None or tier in self.tiers) and (self.agent_names is None or name in self.agent_names)
+
+    def push(self, tier, name, status):
+        with self._lock:
+            self._pending[(tier, name)] = status
+        self._ready.set()
+
+    def wait(self, timeout):
+        """
+        Blocks until there are updates or the timeout passes.
+
+        Returns:
+        - dict: {tier: {name: status}} of pending updates, empty on timeout.
+        """
+        if not self._ready.wait(timeout):
+            return {}
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._ready.clear()
+        delta = {}
+        for (tier, name), status in pending.items():
+            delta.setdefault(tier, {})[name] = status
+        return delta
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+
+class StatusBroadcaster:
+    """
+    Fans agent status changes out to subscribed dashboards.
+
+    Publishing an unchanged status is a no-op. A subscriber only receives agents that match
+    its filters, and updates that arrive while it is waiting to send are merged per agent.
+    Idle subscribers are blocked threads (greenlets under the gevent worker) and cost no CPU.
+
+    Parameters:
+    - max_subscribers (int): Streams this process serves at once; None for no limit.
+    """
+
+    def __init__(self, max_subscribers=None):
+        self.max_subscribers = max_subscribers
+        self._statuses = {}  # (tier, name) -> last published status
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.version = 0
+        self.closed = False
+        _broadcasters.add(self)
+
+    def publish(self, tier, name, status):
+        key = (tier, name)
+        with self._lock:
+            if self._statuses.get(key) == status:
+                return
+            self._statuses[key] = status
+            self.version += 1
+            subscribers = [subscriber for subscriber in self._subscribers if subscriber.matches(tier, name)]
+        for subscriber in subscribers:
+            subscriber.push(tier, name, status)
+
+    def subscribe(self, tiers=None, agent_names=None):
+        """
+        Returns a new subscriber, or None when the broadcaster is full or shutting down.
+        """
+        subscriber = StatusSubscriber(tiers, agent_names)
+        with self._lock:
+            if self.closed or (self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers):
+                return None
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def close(self):
+        """
+        Ends every open stream and refuses new subscribers.
+        """
+        with self._lock:
+            self.closed = True
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.close()
+
+
+# Function to end the status streams of every broadcaster in this process, e.g. when a worker begins a graceful shutdown
+def close_status_streams():
+    for broadcaster in list(_broadcasters):
+        broadcaster.close()
+
+
+# Function to format one server-sent event
+def format_event(event, data, event_id=None, retry=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if retry is not None:
+        lines.append(f"retry: {int(retry * 1000)}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream_status_events(broadcaster, subscriber, snapshot, coalesce_interval=0.25, heartbeat_interval=15.0,
+                         max_age=300.0, retry=2.0):
+    """
+    Yields server-sent events for one subscriber: a full snapshot, then only deltas.
+
+    After the first update of a burst arrives, the stream waits `coalesce_interval` seconds
+    so rapid changes to the same agent go out as one event. A comment line is sent every
+    `heartbeat_interval` seconds of silence to keep proxies from closing the connection.
+
+    The stream ends after 80-100% of `max_age` seconds, or as soon as the broadcaster is
+    closed, so connections are spread over restarted and new workers; the snapshot tells
+    the browser to reconnect `retry` seconds after that, and the new connection starts
+    with a fresh snapshot.
+
+    Parameters:
+    - broadcaster (StatusBroadcaster): Source of updates; the subscriber is removed on disconnect.
+    - subscriber (StatusSubscriber): Created by broadcaster.subscribe() before the snapshot was taken.
+    - snapshot (dict): {tier: {name: status}} of the agents matching the subscriber's filters.
+    """
+    deadline = time.monotonic() + max_age * random.uniform(0.8, 1.0)
+    try:
+        yield format_event('snapshot', snapshot, broadcaster.version, retry)
+        while not subscriber.closed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            delta = subscriber.wait(min(heartbeat_interval, remaining))
+            if subscriber.closed:
+                break
+            if not delta:
+                if remaining > heartbeat_interval:
+                    yield ': keep-alive\n\n'
+                continue
+            time.sleep(coalesce_interval)
+            for tier, statuses in subscriber.wait(0).items():
+                delta.setdefault(tier, {}).update(statuses)
+            yield format_event('delta', delta, broadcaster.version)
+    finally:
+        broadcaster.unsubscribe(subscriber)
@@ -0,0 +1,96 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+# How long an address result from api.idefi.ai is reused before the address is sent upstream again
+RESULT_TTL = float(os.getenv('UPLOAD_RESULT_TTL', 24 * 3600))
+
+
+# Function to fingerprint uploaded file content
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+class UploadResultStore:
+    """
+    Local SQLite store of per-address upload results, upload fingerprints and each user's
+    last uploaded address set, used to avoid re-sending unchanged addresses upstream.
+
+    Parameters:
+    - path (str): SQLite database file; shared safely by every worker on the host.
+    - result_ttl (float): Seconds an address result stays fresh.
+    """
+
+    def __init__(self, path, result_ttl=RESULT_TTL):
+        self.path = path
+        self.result_ttl = result_ttl
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS results (
+                    address TEXT PRIMARY KEY, status TEXT, description TEXT, checked_at REAL);
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    user_id TEXT, content_hash TEXT, file_url TEXT, created_at REAL,
+                    PRIMARY KEY (user_id, content_hash));
+                CREATE TABLE IF NOT EXISTS user_addresses (
+                    user_id TEXT, address TEXT, PRIMARY KEY (user_id, address));
+            """)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def latest_upload(self, user_id):
+        """
+        Returns (content_hash, file_url, created_at) of the user's most recent upload, or None.
+        """
+        return self._connection().execute(
+            "SELECT content_hash, file_url, created_at FROM fingerprints WHERE user_id = ? ORDER BY created_at DESC LIMIT 1",
+            (user_id,)).fetchone()
+
+    def fresh_results(self, addresses, now=None):
+        """
+        Returns {address: result} for the addresses that have a result younger than the TTL.
+        """
+        cutoff = (now or time.time()) - self.result_ttl
+        connection = self._connection()
+        found = {}
+        addresses = list(addresses)
+        # SQLite limits bound parameters per statement, so look addresses up in chunks
+        for start in range(0, len(addresses), 500):
+            chunk = addresses[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = connection.execute(
+                f"SELECT address, status, description FROM results WHERE checked_at > ? AND address IN ({placeholders})",
+                (cutoff, *chunk))
+            for address, status, description in rows:
+                found[address] = {"address": address, "status": status, "description": description}
+        return found
+
+    def previous_addresses(self, user_id):
+        rows = self._connection().execute("SELECT address FROM user_addresses WHERE user_id = ?", (user_id,))
+        return {address for (address,) in rows}
+
+    def save_results(self, results, now=None):
+        now = now or time.time()
+        with self._connection() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO results (address, status, description, checked_at) VALUES (?, ?, ?, ?)",
+                [(result['address'].lower(), result.get('status'), result.get('description'), now) for result in results])
+
+    def save_upload(self, user_id, fingerprint, file_url, addresses, now=None):
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO fingerprints (user_id, content_hash, file_url, created_at) VALUES (?, ?, ?, ?)",
+                (user_id, fingerprint, file_url, now or time.time()))
+            connection.execute("DELETE FROM user_addresses WHERE user_id = ?", (user_id,))
+            connection.executemany("INSERT INTO user_addresses (user_id, address) VALUES (?, ?)",
+                                   [(user_id, address) for address in addresses])
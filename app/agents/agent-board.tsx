@@ -13,6 +13,7 @@ import {
 } from '@fortawesome/free-solid-svg-icons';
 import Tippy from '@tippyjs/react';
 import 'tippy.js/dist/tippy.css';
+import { subscribeToAgentStatus, mergeAgentStatuses } from '@/utilities/agentStatusStream';
 
 // Define types for agent roles
 type AgentRole = 'Miner' | 'Builder' | 'Defender' | 'Scout' | 'Healer';
@@ -34,8 +35,16 @@ const AgentBoard: React.FC = () => {
   const [agentStats, setAgentStats] = useState<any>(null); // To track role counts
 
   useEffect(() => {
-    fetchAgents();
     fetchAgentStats(); // Fetch the stats for roles
+
+    // The stream opens with a snapshot of every agent, then pushes only the agents that change
+    return subscribeToAgentStatus({
+      onSnapshot: (statuses) => {
+        setAgents(statuses);
+        setLoading(false);
+      },
+      onDelta: (delta) => setAgents((current: any) => mergeAgentStatuses(current, delta)),
+    });
   }, []);
 
   // Function to fetch agent statuses using fetch API
@@ -81,8 +90,7 @@ const AgentBoard: React.FC = () => {
       });
 
       if (response.ok) {
-        alert(`Task triggered for ${agentName}`);
-        fetchAgents(); // Fetch updated agent status after triggering
+        alert(`Task triggered for ${agentName}`); // The new status arrives over the status stream
       } else {
         alert('Failed to trigger task.');
       }
@@ -3,6 +3,7 @@ import { FontAwesomeIcon } from '@fortawesome/react-fontawesome';
 import { faPauseCircle, faStopCircle, faSpinner, faRobot, faInfoCircle } from '@fortawesome/free-solid-svg-icons';
 import Tippy from '@tippyjs/react';
 import 'tippy.js/dist/tippy.css';
+import { subscribeToAgentStatus, AgentStatuses } from '@/utilities/agentStatusStream';
 
 const AgentManager: React.FC = () => {
   const [agentName, setAgentName] = useState('');
@@ -14,18 +15,15 @@ const AgentManager: React.FC = () => {
   const [isTaskRunning, setIsTaskRunning] = useState<boolean>(false);
   const [agentsList, setAgentsList] = useState<string[]>([]); // List of agents created
 
-  // Fetch agent status
-  const fetchAgentStatus = async () => {
-    try {
-      const response = await fetch(`/api/agents/status?agent_name=${agentName}`);
-      if (response.ok) {
-        const data = await response.json();
-        setAgentStatus(data.status);
-        setIsTaskRunning(data.status === 'Running');
+  // Apply the entered agent's status from a stream snapshot or delta
+  const applyAgentStatus = (statuses: AgentStatuses) => {
+    Object.values(statuses).forEach((agents) => {
+      const status = agents[agentName];
+      if (status) {
+        setAgentStatus(status.status);
+        setIsTaskRunning(status.status === 'Running');
       }
-    } catch (error) {
-      setMessage('Failed to fetch agent status.');
-    }
+    });
   };
 
   // Assign task to the agent
@@ -46,8 +44,7 @@ const AgentManager: React.FC = () => {
       if (response.ok) {
         const data = await response.json();
         setMessage(`Task "${task}" assigned successfully to agent "${agentName}".`);
-        setTaskHistory((prev) => [...prev, task]);
-        fetchAgentStatus();
+        setTaskHistory((prev) => [...prev, task]); // The agent's new status arrives over the status stream
       } else {
         const errorData = await response.json();
         setMessage(`Error: ${errorData.error}`);
@@ -107,11 +104,23 @@ const AgentManager: React.FC = () => {
     }
   };
 
-  // Fetch agent status initially when agent name is entered
+  // Follow the entered agent's status over the status stream, once the name stops changing
   useEffect(() => {
-    if (agentName) {
-      fetchAgentStatus();
+    if (!agentName) {
+      return;
     }
+    let unsubscribe = () => {};
+    const timer = setTimeout(() => {
+      unsubscribe = subscribeToAgentStatus({
+        agentNames: [agentName],
+        onSnapshot: applyAgentStatus,
+        onDelta: applyAgentStatus,
+      });
+    }, 300);
+    return () => {
+      clearTimeout(timer);
+      unsubscribe();
+    };
   }, [agentName]);
 
   return (
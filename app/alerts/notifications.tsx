@@ -10,6 +10,11 @@ import { FontAwesomeIcon } from "@fortawesome/react-fontawesome";
 import { faBell, faCheck, faTimes, faInfoCircle } from "@fortawesome/free-solid-svg-icons";
 import Tippy from "@tippyjs/react";
 import "tippy.js/dist/tippy.css";
+import { subscribeToAgentStatus, AgentStatuses } from "@/utilities/agentStatusStream";
+
+// Smart agent that runs the wallet security checks
+const MONITOR_AGENT_TYPE = "Smart";
+const MONITOR_AGENT_NAME = "SmartAgent";
 
 const Notifications: React.FC = () => {
   const [walletAddress, setWalletAddress] = useState<string>("");
@@ -17,6 +22,7 @@ const Notifications: React.FC = () => {
   const [alerts, setAlerts] = useState<string[]>([]);
   const [userEmail, setUserEmail] = useState<string | null>(null); // User's email from Firebase
   const [userUID, setUserUID] = useState<string | null>(null); // UID for each user
+  const [monitorStatus, setMonitorStatus] = useState<string | null>(null); // Pushed status of the monitoring agent
 
   const [notificationPreferences, setNotificationPreferences] = useState({
     generalUpdates: false,
@@ -48,6 +54,22 @@ const Notifications: React.FC = () => {
     return () => unsubscribe();
   }, []);
 
+  // Follow the monitoring agent's status over the status stream
+  useEffect(() => {
+    const applyMonitorStatus = (statuses: AgentStatuses) => {
+      const status = statuses[MONITOR_AGENT_TYPE]?.[MONITOR_AGENT_NAME];
+      if (status) {
+        setMonitorStatus(status.status);
+      }
+    };
+    return subscribeToAgentStatus({
+      agentTypes: [MONITOR_AGENT_TYPE],
+      agentNames: [MONITOR_AGENT_NAME],
+      onSnapshot: applyMonitorStatus,
+      onDelta: applyMonitorStatus,
+    });
+  }, []);
+
   const handleToggleChange = (preference: keyof typeof notificationPreferences) => {
     const auth = getAuth();
     const user = auth.currentUser;
@@ -83,7 +105,7 @@ const Notifications: React.FC = () => {
           "Content-Type": "application/json",
         },
         body: JSON.stringify({
-          agent_name: "SmartAgent",
+          agent_name: MONITOR_AGENT_NAME,
           address: walletAddress,
         }),
       });
@@ -127,6 +149,9 @@ const Notifications: React.FC = () => {
         {/* Notification Center Section */}
         <div className="mt-6">
           <h2 className="text-lg font-semibold text-gray-700">Your Notifications</h2>
+          {monitorStatus && (
+            <p className="text-sm text-gray-500 mt-1">Monitoring agent status: {monitorStatus}</p>
+          )}
           <ul className="space-y-4 mt-4">
             {alerts.length > 0 ? (
               alerts.map((alert, index) => (
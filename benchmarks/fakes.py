@@ -0,0 +1,153 @@
+import os
+import json
+import base64
+import itertools
+import threading
+from unittest import mock
+
+
+class FakeDocument:
+    def __init__(self, store, collection, document_id):
+        self.store = store
+        self.collection = collection
+        self.id = document_id
+
+    def set(self, data):
+        with self.store.lock:
+            self.store.documents.setdefault(self.collection, {})[self.id] = data
+
+
+class FakeCollection:
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+
+    def document(self, document_id=None):
+        return FakeDocument(self.store, self.name, document_id or f"doc{next(self.store.ids)}")
+
+
+class FakeBatch:
+    def __init__(self):
+        self.writes = []
+
+    def set(self, document, data):
+        self.writes.append((document, data))
+
+    def commit(self):
+        for document, data in self.writes:
+            document.set(data)
+
+
+class FakeFirestore:
+    """
+    In-memory stand-in for the parts of the Firestore client the API uses.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch()
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.public_url = f"https://storage.local/{bucket.name}/{name}"
+
+    def upload_from_file(self, file, content_type=None):
+        self.bucket.files[self.name] = file.read()
+
+
+class FakeBucket:
+    """
+    In-memory stand-in for the Firebase Storage bucket.
+    """
+
+    def __init__(self, name='api-idefi-ai.appspot.com'):
+        self.name = name
+        self.files = {}
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+
+class FakeOpenAIResponse(dict):
+    def __init__(self, text):
+        super().__init__(data=[{"url": "https://images.local/agent.png"}])
+        self.choices = [mock.Mock(text=text)]
+
+
+# Function to stand in for openai.Image.create and openai.Completion.create
+def fake_openai_create(*args, **kwargs):
+    return FakeOpenAIResponse("Benchmark completion")
+
+
+class FakeContext:
+    """
+    Stand-in for uagents.Context that dispatches straight to the agent's task handler.
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+
+    def send(self, agent_name, payload):
+        return self.agent.handle(payload)
+
+
+class FakeAgent:
+    def __init__(self, name):
+        self.name = name
+        self.tasks_completed = 0
+
+    def handle(self, payload):
+        self.tasks_completed += 1
+        return {"message": f"{self.name} processed task", "tasks_completed": self.tasks_completed}
+
+    def get_status(self):
+        return {"name": self.name, "status": "idle", "tasks_completed": self.tasks_completed}
+
+
+def install_fakes(upstream_urls):
+    """
+    Patches Firebase, OpenAI and upstream URLs so api.index can be imported and driven offline.
+
+    Parameters:
+    - upstream_urls (dict): Environment overrides for IDEFI_API_URL and Q_IDEFI_API_URL.
+
+    Returns:
+    - dict: The fake Firestore client and Storage bucket, plus the patchers to stop later.
+    """
+    os.environ.update(upstream_urls)
+    os.environ.setdefault('NEXT_PUBLIC_FIREBASE_SERVICE_ACCOUNT_KEY', base64.b64encode(json.dumps({}).encode()).decode())
+
+    firestore_client = FakeFirestore()
+    bucket = FakeBucket()
+    patchers = [
+        mock.patch('firebase_admin.credentials.Certificate', return_value=object()),
+        mock.patch('firebase_admin.initialize_app', return_value=object()),
+        mock.patch('firebase_admin.firestore.client', return_value=firestore_client),
+        mock.patch('firebase_admin.storage.bucket', return_value=bucket),
+        mock.patch('openai.Image.create', side_effect=fake_openai_create),
+        mock.patch('openai.Completion.create', side_effect=fake_openai_create),
+    ]
+    for patcher in patchers:
+        patcher.start()
+    return {"firestore": firestore_client, "bucket": bucket, "patchers": patchers}
+
+
+def install_agents(index_module, agents_per_tier=10):
+    """
+    Registers fake agents in every tier and routes agent dispatch through FakeContext.
+    """
+    index_module.Context = FakeContext
+    for tier in list(index_module.agent_instances):
+        for number in range(1, agents_per_tier + 1):
+            name = f"{tier}Agent{number}"
+            index_module.register_agent(tier, name, FakeAgent(name))
@@ -0,0 +1,99 @@
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Function to build a canned response for an upstream endpoint from the request payload
+def canned_response(service, endpoint, payload):
+    if endpoint == 'upload':
+        return {"details": [{"address": address, "status": "clean", "description": "No risk indicators"}
+                            for address in payload]}
+    if endpoint == 'checkaddress':
+        address = payload.get('address', '')
+        flagged = int(address[-1], 16) % 8 == 0 if address else False
+        return {"address": address, "status": "flagged" if flagged else "clean", "risk_score": 87 if flagged else 3}
+    if endpoint in ('basic_metrics', 'intermediate_metrics', 'advanced_metrics'):
+        return {"address": payload.get('address'), "metric_level": endpoint.split('_')[0],
+                "transaction_count": 1200, "balance": "12.5", "risk_score": 12}
+    if endpoint == 'generate-explanation':
+        return {"explanation": "The portfolio risk is concentrated in two assets."}
+    if endpoint in ('initialize_memory', 'store_in_memory', 'retrieve_from_memory'):
+        return {"message": f"{endpoint} completed", "state": payload.get('state', '0')}
+    if endpoint in ('quantum_risk_analysis', 'portfolio_optimization'):
+        return {"result": {asset: 1.0 / max(len(payload.get('portfolio', {})), 1) for asset in payload.get('portfolio', {})}}
+    return {"service": service, "endpoint": endpoint, "ok": True}
+
+
+class MockUpstream:
+    """
+    Local HTTP stand-in for api.idefi.ai and q.idefi.ai.
+
+    Every request sleeps for `latency` seconds plus gaussian `jitter` drawn from a seeded
+    generator, so the same settings give the same latency profile on every run.
+    """
+
+    def __init__(self, latency=0.02, jitter=0.005, seed=1, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.request_count = 0
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b'{}'
+                try:
+                    payload = json.loads(body or b'{}')
+                except ValueError:
+                    payload = {}
+
+                # Paths look like /<service>/api/<endpoint>
+                parts = self.path.strip('/').split('/', 2)
+                service, endpoint = parts[0], parts[2] if len(parts) > 2 else ''
+                time.sleep(upstream._next_delay())
+
+                response = json.dumps(canned_response(service, endpoint, payload)).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    def _next_delay(self):
+        with self._random_lock:
+            self.request_count += 1
+            return max(0.0, self._random.gauss(self.latency, self.jitter))
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def urls(self):
+        return {
+            "IDEFI_API_URL": f"{self.base_url}/api.idefi.ai/api",
+            "Q_IDEFI_API_URL": f"{self.base_url}/q.idefi.ai/api",
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='mock-upstream', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,221 @@
+"""
+Benchmark runner for the Flask API against local stand-ins for every external dependency.
+
+Usage:
+    python -m benchmarks.run --workload all --requests 500 --concurrency 8
+    python -m benchmarks.run --compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+import tracemalloc
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.mock_upstream import MockUpstream
+from benchmarks.fakes import install_fakes, install_agents
+from benchmarks.workloads import WORKLOADS, make_rng
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Admission control answers these without doing the work, so their latency is reported apart from served requests
+REJECTED_STATUSES = (429, 503)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def latency_summary(sorted_latencies):
+    return {
+        "p50": round(percentile(sorted_latencies, 0.50) * 1000, 3),
+        "p95": round(percentile(sorted_latencies, 0.95) * 1000, 3),
+        "p99": round(percentile(sorted_latencies, 0.99) * 1000, 3),
+        "max": round(sorted_latencies[-1] * 1000, 3) if sorted_latencies else 0.0,
+    }
+
+
+def git_revision():
+    try:
+        revision = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD'], stderr=subprocess.DEVNULL) != 0
+        return revision + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+# Function to point every on-disk store of the API into a fresh scratch directory, so no run is answered from an earlier one
+def scratch_environment():
+    scratch = tempfile.mkdtemp(prefix='idefi-bench-')
+    return {
+        "ADDRESS_INDEX_DIR": os.path.join(scratch, 'address_index'),
+        "UPLOAD_STORE_DB": os.path.join(scratch, 'upload_store.db'),
+        "AGENT_STATE_DIR": os.path.join(scratch, 'agent_state'),
+        "EXPLANATION_CACHE_DIR": os.path.join(scratch, 'explanation_cache'),
+        "MAIL_OUTBOX_PATH": os.path.join(scratch, 'outbox.jsonl'),
+    }
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_workload(app, name, requests, concurrency, seed, warmup, trace_memory=False):
+    workload = WORKLOADS[name]
+    latencies = []
+    rejected_latencies = []
+    failures = []
+    lock = threading.Lock()
+
+    def worker(worker_id, count):
+        client = app.test_client()
+        rng = make_rng(seed, f"{name}:{worker_id}")
+        local_latencies = []
+        local_rejected = []
+        local_failures = []
+        for _ in range(count):
+            start = time.perf_counter()
+            response = workload(client, rng)
+            latency = time.perf_counter() - start
+            (local_rejected if response.status_code in REJECTED_STATUSES else local_latencies).append(latency)
+            if response.status_code >= 400:
+                local_failures.append(response.status_code)
+        with lock:
+            latencies.extend(local_latencies)
+            rejected_latencies.extend(local_rejected)
+            failures.extend(local_failures)
+
+    # Warm up imports, connection setup and caches before timing
+    warmup_client = app.test_client()
+    warmup_rng = make_rng(seed, f"{name}:warmup")
+    for _ in range(warmup):
+        workload(warmup_client, warmup_rng)
+
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    # tracemalloc slows every allocation down, so heap tracing is a separate opt-in
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency), per_worker))
+    elapsed = time.perf_counter() - start
+    heap_peak = None
+    if trace_memory:
+        _, heap_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    latencies.sort()
+    rejected_latencies.sort()
+    total = len(latencies) + len(rejected_latencies)
+    return {
+        "requests": total,
+        "errors": len(failures),
+        "error_statuses": sorted(set(failures)),
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        # Served requests only, so runs with and without rate limiting stay comparable
+        "latency_ms": latency_summary(latencies),
+        "rejected": {"requests": len(rejected_latencies), "latency_ms": latency_summary(rejected_latencies)},
+        "heap_peak_mb": round(heap_peak / (1024 * 1024), 2) if heap_peak is not None else None,
+        "rss_peak_mb": peak_rss_mb(),
+    }
+
+
+def run(args):
+    upstream = MockUpstream(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, seed=args.seed).start()
+    install_fakes(upstream.urls())
+    os.environ.update(scratch_environment())
+
+    # api.index reads its configuration at import time, so import it only after the fakes and scratch paths are in place
+    from api import index
+    install_agents(index, agents_per_tier=10)
+
+    names = list(WORKLOADS) if args.workload == 'all' else args.workload.split(',')
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "seed": args.seed,
+            "trace_memory": args.trace_memory,
+        },
+        "workloads": {},
+    }
+    for name in names:
+        result = run_workload(index.app, name, args.requests, args.concurrency, args.seed, args.warmup, args.trace_memory)
+        report["workloads"][name] = result
+        latency = result["latency_ms"]
+        print(f"{name:18} {result['throughput_rps']:>9.1f} req/s  p50 {latency['p50']:>8.2f} ms  "
+              f"p95 {latency['p95']:>8.2f} ms  p99 {latency['p99']:>8.2f} ms  "
+              f"rss {result['rss_peak_mb']} MB  errors {result['errors']}  rejected {result['rejected']['requests']}")
+    upstream.stop()
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{report['revision']}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {path}")
+    return report
+
+
+def compare(baseline_path, candidate_path):
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    with open(candidate_path) as file:
+        candidate = json.load(file)
+
+    if baseline["settings"] != candidate["settings"]:
+        print("Warning: runs used different settings, results are not directly comparable")
+    print(f"{baseline['revision']} -> {candidate['revision']}")
+    for name, after in candidate["workloads"].items():
+        before = baseline["workloads"].get(name)
+        if not before:
+            continue
+        change = (after["throughput_rps"] / before["throughput_rps"] - 1) * 100 if before["throughput_rps"] else 0.0
+        print(f"{name:18} throughput {before['throughput_rps']:>9.1f} -> {after['throughput_rps']:>9.1f} ({change:+.1f}%)  "
+              f"p99 {before['latency_ms']['p99']:>8.2f} -> {after['latency_ms']['p99']:>8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API against local stand-ins for its dependencies.")
+    parser.add_argument('--workload', default='all', help=f"Comma-separated workloads or 'all' ({', '.join(WORKLOADS)})")
+    parser.add_argument('--requests', type=int, default=500, help="Requests per workload")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent clients")
+    parser.add_argument('--warmup', type=int, default=20, help="Untimed requests before each workload")
+    parser.add_argument('--latency-ms', type=float, default=20.0, help="Mean mock upstream latency")
+    parser.add_argument('--jitter-ms', type=float, default=5.0, help="Standard deviation of mock upstream latency")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--trace-memory', action='store_true', help="Record Python heap peaks with tracemalloc (slower)")
+    parser.add_argument('--output', default=RESULTS_DIR)
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'), help="Compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Throughput scaling of the production server across worker processes.
+
+Starts gunicorn with gunicorn.conf.py once per worker count, drives it over real HTTP from
+several client processes, and reports how close each step gets to linear scaling.
+
+Usage:
+    python -m benchmarks.workers --workers 1,2,4,8 --workload status_polling --requests 4000
+"""
+import os
+import io
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import platform
+import subprocess
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.mock_upstream import MockUpstream
+from benchmarks.workloads import WORKLOADS, make_rng
+from benchmarks.run import RESULTS_DIR, REJECTED_STATUSES, latency_summary, git_revision, scratch_environment
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+class HttpClient:
+    """
+    Keep-alive HTTP client with the subset of the Flask test client API the workloads use.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def get(self, path, query_string=None):
+        return self.session.get(self.base_url + path, params=query_string)
+
+    def post(self, path, json=None, data=None, content_type=None):
+        files = {}
+        form = {}
+        for field, value in (data or {}).items():
+            if isinstance(value, tuple) and isinstance(value[0], io.IOBase):
+                files[field] = (value[1], value[0])
+            else:
+                form[field] = value
+        return self.session.post(self.base_url + path, json=json, data=form or None, files=files or None)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers, threads, port, environment):
+    command = [
+        sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT_DIR, 'gunicorn.conf.py'),
+        '--workers', str(workers), '--threads', str(threads),
+        '--bind', f'127.0.0.1:{port}', '--access-logfile', '/dev/null',
+        'benchmarks.wsgi:app',
+    ]
+    process = subprocess.Popen(command, cwd=ROOT_DIR, env=environment,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    # Ready once every worker can answer; a handful of probes spreads across the workers
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {process.returncode}")
+        try:
+            if all(requests.get(f'http://127.0.0.1:{port}/api/agents_tracking', timeout=1).ok for _ in range(workers * 2)):
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("gunicorn did not start within 60 seconds")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def client_process(base_url, workload_name, requests_count, concurrency, seed, client_id):
+    workload = WORKLOADS[workload_name]
+
+    def worker(worker_id, count):
+        client = HttpClient(base_url)
+        rng = make_rng(seed, f"{workload_name}:{client_id}:{worker_id}")
+        latencies = []
+        failures = 0
+        for _ in range(count):
+            start = time.perf_counter()
+            response = workload(client, rng)
+            latencies.append((time.perf_counter() - start, response.status_code in REJECTED_STATUSES))
+            if response.status_code >= 400:
+                failures += 1
+        return latencies, failures
+
+    per_worker = [requests_count // concurrency + (1 if i < requests_count % concurrency else 0) for i in range(concurrency)]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(worker, range(concurrency), per_worker))
+    return [sample for latencies, _ in results for sample in latencies], sum(failures for _, failures in results)
+
+
+def measure(base_url, args):
+    # Clients run in their own processes so the load generator is not limited to one core either
+    per_client = [args.requests // args.clients + (1 if i < args.requests % args.clients else 0) for i in range(args.clients)]
+    with multiprocessing.Pool(args.clients) as pool:
+        # Untimed warm-up so every worker has imported and connected before timing
+        pool.starmap(client_process, [(base_url, args.workload, args.warmup, 1, args.seed, f"warmup{i}") for i in range(args.clients)])
+        start = time.perf_counter()
+        results = pool.starmap(client_process, [(base_url, args.workload, count, args.concurrency, args.seed, i)
+                                                for i, count in enumerate(per_client)])
+        elapsed = time.perf_counter() - start
+
+    samples = [sample for client_latencies, _ in results for sample in client_latencies]
+    latencies = sorted(latency for latency, rejected in samples if not rejected)
+    rejected_latencies = sorted(latency for latency, rejected in samples if rejected)
+    return {
+        "requests": len(samples),
+        "errors": sum(failures for _, failures in results),
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": latency_summary(latencies),
+        "rejected": {"requests": len(rejected_latencies), "latency_ms": latency_summary(rejected_latencies)},
+    }
+
+
+def run(args):
+    upstream = MockUpstream(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, seed=args.seed).start()
+    environment = dict(os.environ, **upstream.urls())
+    environment["BENCHMARK_AGENTS_PER_TIER"] = str(args.agents_per_tier)
+    environment.pop('SHARED_STATE_PATH', None)
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "settings": {
+            "workload": args.workload,
+            "requests": args.requests,
+            "clients": args.clients,
+            "concurrency": args.concurrency,
+            "threads": args.threads,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "seed": args.seed,
+        },
+        "workers": {},
+    }
+    baseline = None
+    for workers in [int(count) for count in args.workers.split(',')]:
+        port = free_port()
+        # Fresh stores per worker count, so later steps are not answered from what earlier ones wrote
+        process = start_server(workers, args.threads, port, dict(environment, **scratch_environment()))
+        try:
+            result = measure(f'http://127.0.0.1:{port}', args)
+        finally:
+            stop_server(process)
+
+        baseline = baseline or result["throughput_rps"] / workers
+        result["scaling_efficiency"] = round(result["throughput_rps"] / (baseline * workers), 3) if baseline else 0.0
+        report["workers"][str(workers)] = result
+        latency = result["latency_ms"]
+        print(f"{workers:>3} workers {result['throughput_rps']:>9.1f} req/s  efficiency {result['scaling_efficiency']:>5.2f}  "
+              f"p50 {latency['p50']:>8.2f} ms  p99 {latency['p99']:>8.2f} ms  errors {result['errors']}  "
+              f"rejected {result['rejected']['requests']}")
+    upstream.stop()
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{report['revision']}_workers_{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {path}")
+    return report
+
+
+def main():
+    cpu_count = multiprocessing.cpu_count()
+    default_workers = ','.join(str(2 ** power) for power in range(cpu_count.bit_length()) if 2 ** power <= cpu_count)
+
+    parser = argparse.ArgumentParser(description="Measure API throughput under gunicorn as worker processes are added.")
+    parser.add_argument('--workers', default=default_workers, help="Comma-separated worker counts to test")
+    parser.add_argument('--threads', type=int, default=4, help="Threads per worker")
+    parser.add_argument('--workload', default='status_polling', choices=sorted(WORKLOADS))
+    parser.add_argument('--requests', type=int, default=4000, help="Timed requests per worker count")
+    parser.add_argument('--clients', type=int, default=max(2, cpu_count), help="Load generator processes")
+    parser.add_argument('--concurrency', type=int, default=4, help="Concurrent connections per client process")
+    parser.add_argument('--warmup', type=int, default=20, help="Untimed requests per client process")
+    parser.add_argument('--agents-per-tier', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help="Mean mock upstream latency")
+    parser.add_argument('--jitter-ms', type=float, default=5.0, help="Standard deviation of mock upstream latency")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=RESULTS_DIR)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import io
+import random
+
+# Workloads take a Flask test client and a seeded random generator and issue a single request.
+# Each returns the response so the runner can check the status code.
+
+
+def _address(rng):
+    return '0x' + ''.join(rng.choice('0123456789abcdef') for _ in range(40))
+
+
+# Dashboard polling of the three metric levels for a wallet
+def metrics_polling(client, rng):
+    level = rng.choice(('basic_metrics', 'intermediate_metrics', 'advanced_metrics'))
+    return client.get(f'/api/{level}', query_string={'address': _address(rng)})
+
+
+# Upload of a wallet CSV with a few hundred addresses
+def bulk_upload(client, rng, addresses=250):
+    rows = 'address\n' + ''.join(_address(rng) + '\n' for _ in range(addresses))
+    data = {'file': (io.BytesIO(rows.encode()), 'wallets.csv')}
+    return client.post('/api/upload', data=data, content_type='multipart/form-data')
+
+
+# Task assignment to agents across all tiers
+def agent_assignment(client, rng, agents_per_tier=10):
+    tier = rng.choice(('Free', 'Standard', 'Smart', 'Quantum'))
+    return client.post('/api/agents_assign', json={
+        'agent_type': tier,
+        'agent_name': f"{tier}Agent{rng.randint(1, agents_per_tier)}",
+        'tasks': {'task': 'process_wallet_addresses', 'data': [_address(rng)]},
+    })
+
+
+# Mix of quantum memory, risk analysis and optimization calls
+def quantum_calls(client, rng):
+    choice = rng.randrange(4)
+    if choice == 0:
+        return client.post('/api/initialize_memory', json={})
+    if choice == 1:
+        return client.post('/api/store_in_memory', json={'state': rng.choice(('0', '1', '+', '-'))})
+    portfolio = {asset: rng.random() for asset in ('ETH', 'BTC', 'USDC', 'SOL')}
+    endpoint = 'quantum_risk_analysis' if choice == 2 else 'portfolio_optimization'
+    return client.post(f'/api/{endpoint}', json={'portfolio': portfolio})
+
+
+# Dashboard polling of every agent's status; no upstream calls, so it is bound by the API's own CPU time
+def status_polling(client, rng):
+    return client.get('/api/agents_status')
+
+
+# Quantum memory demo run locally: one session stores and reads back a state in a single pipelined call
+def quantum_memory_pipeline(client, rng):
+    state = rng.choice(('0', '1', '+', '-'))
+    return client.post('/api/quantum_memory_pipeline', json={
+        'session_id': f"bench-{rng.randrange(1000)}",
+        'operations': [
+            {'op': 'initialize'},
+            {'op': 'store', 'state': state},
+            {'op': 'retrieve', 'basis': 'x' if state in '+-' else 'z', 'shots': 100},
+        ],
+    })
+
+
+WORKLOADS = {
+    'metrics_polling': metrics_polling,
+    'status_polling': status_polling,
+    'bulk_upload': bulk_upload,
+    'agent_assignment': agent_assignment,
+    'quantum_calls': quantum_calls,
+    'quantum_memory_pipeline': quantum_memory_pipeline,
+}
+
+
+def make_rng(seed, worker):
+    return random.Random(f"{seed}:{worker}")
@@ -0,0 +1,17 @@
+"""
+WSGI entry point that serves api.index against the benchmark stand-ins, for running under gunicorn:
+
+    IDEFI_API_URL=... Q_IDEFI_API_URL=... gunicorn -c gunicorn.conf.py benchmarks.wsgi:app
+"""
+import os
+
+from benchmarks.fakes import install_fakes, install_agents
+
+# Upstream URLs come from the environment set by whoever started the server
+install_fakes({})
+
+from api import index
+
+install_agents(index, agents_per_tier=int(os.getenv('BENCHMARK_AGENTS_PER_TIER', 10)))
+
+app = index.app
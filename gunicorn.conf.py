@@ -0,0 +1,98 @@
+"""
+Gunicorn settings for serving the API in production:
+
+    gunicorn -c gunicorn.conf.py api.index:app
+
+Worker processes, the worker class and preloading are configurable through the environment.
+Workers are gevent-based by default, so long-lived /api/agents_status_stream connections are
+greenlets rather than threads; GUNICORN_WORKER_CLASS=gthread switches to a fixed thread pool.
+Agent statuses, tracking counters and cache generations live in a shared-memory segment that
+the master creates before forking, and rate limit buckets in a SQLite file beside it, so every
+worker sees the same view.
+"""
+import os
+import sys
+import signal
+import threading
+import multiprocessing
+
+# One process per core by default; greenlets (or threads) cover requests that wait on q.idefi.ai and api.idefi.ai
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+if worker_class == 'gevent':
+    # Patch before the app is preloaded, so the locks, sleeps and sockets it creates all yield to the event loop
+    from gevent import monkey
+    monkey.patch_all()
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api.shared_state import SharedState, remove_shared_state
+from api.status_stream import close_status_streams
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5328')}"
+
+# Create the shared segment here, while the config is read and before the app is preloaded, so the app attaches to
+# it rather than making its own; workers find it through the environment. Only a segment named here is reset: a
+# path already exported (set by the operator, or by this file before a reload re-reads it) is attached as it is.
+if not os.getenv('SHARED_STATE_PATH'):
+    shm_directory = '/dev/shm' if os.path.isdir('/dev/shm') else '/tmp'
+    os.environ['SHARED_STATE_PATH'] = os.path.join(shm_directory, f"idefi_state_{os.getpid()}")
+    fresh_shared_state = True
+else:
+    fresh_shared_state = False
+SharedState(
+    os.environ['SHARED_STATE_PATH'],
+    status_slots=int(os.getenv('SHARED_STATUS_SLOTS', 2048)),
+    status_slot_size=int(os.getenv('SHARED_STATUS_SLOT_SIZE', 4096)),
+    reset=fresh_shared_state,
+)
+
+# Rate limit buckets live in SQLite next to the segment, so tier limits hold across workers rather than per worker;
+# it is a companion file of the segment and removed with it on exit
+os.environ.setdefault('AGENT_SCHEDULER_DB', os.environ['SHARED_STATE_PATH'] + '.scheduler.db')
+
+# Open status streams per worker: half its connections, leaving the rest for ordinary requests. Set here, before
+# the app is preloaded, so it follows GUNICORN_WORKER_CONNECTIONS / GUNICORN_THREADS rather than command-line flags.
+os.environ.setdefault('STATUS_STREAM_MAX_SUBSCRIBERS',
+                      str(worker_connections // 2 if worker_class == 'gevent' else max(1, threads // 2)))
+
+# Import the app once in the master so workers share its memory copy-on-write and start instantly.
+# Firebase clients open their gRPC channels on first use, which happens in the workers after the fork.
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers after this many requests to bound slow leaks; 0 disables it
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+
+
+def on_starting(server):
+    server.log.info("Shared state segment at %s", os.environ['SHARED_STATE_PATH'])
+
+
+def post_worker_init(worker):
+    # On a graceful stop, end open status streams first so the worker is not held for graceful_timeout;
+    # browsers reconnect to the other workers. Closing takes locks, so it runs outside the signal handler.
+    handle_exit = worker.handle_exit
+
+    def close_streams_and_exit(sig, frame):
+        if worker_class == 'gevent':
+            import gevent
+            gevent.spawn(close_status_streams)
+        else:
+            threading.Thread(target=close_status_streams, daemon=True).start()
+        handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, close_streams_and_exit)
+
+
+def on_exit(server):
+    remove_shared_state(os.environ['SHARED_STATE_PATH'])
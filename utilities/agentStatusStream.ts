@@ -0,0 +1,56 @@
+// Agent statuses keyed by tier, then agent name, as sent by /api/agents_status_stream
+export type AgentStatuses = Record<string, Record<string, any>>;
+
+interface AgentStatusStreamOptions {
+  agentTypes?: string[];
+  agentNames?: string[];
+  onSnapshot: (statuses: AgentStatuses) => void;
+  onDelta: (statuses: AgentStatuses) => void;
+}
+
+// Seconds to wait before reconnecting after the server refuses a stream (e.g. 503 when a worker is full)
+const REFUSED_RETRY_SECONDS = 5;
+
+// Merge a delta into the statuses held by a component
+export const mergeAgentStatuses = (current: AgentStatuses, delta: AgentStatuses): AgentStatuses => {
+  const next = { ...current };
+  Object.keys(delta).forEach((agentType) => {
+    next[agentType] = { ...(next[agentType] || {}), ...delta[agentType] };
+  });
+  return next;
+};
+
+// Subscribe to pushed agent status changes; returns a function that closes the stream.
+// The server ends each stream after a few minutes and EventSource reconnects by itself, receiving a
+// fresh snapshot. A refused connection is not retried by EventSource, so it is reopened here after a delay.
+export const subscribeToAgentStatus = ({ agentTypes, agentNames, onSnapshot, onDelta }: AgentStatusStreamOptions) => {
+  const params = new URLSearchParams();
+  if (agentTypes && agentTypes.length > 0) params.set('agent_type', agentTypes.join(','));
+  if (agentNames && agentNames.length > 0) params.set('agent_name', agentNames.join(','));
+  const query = params.toString();
+  const url = `/api/agents_status_stream${query ? `?${query}` : ''}`;
+
+  let source: EventSource | null = null;
+  let retryTimer: ReturnType<typeof setTimeout> | null = null;
+  let closed = false;
+
+  const connect = () => {
+    source = new EventSource(url);
+    source.addEventListener('snapshot', (event) => onSnapshot(JSON.parse((event as MessageEvent).data)));
+    source.addEventListener('delta', (event) => onDelta(JSON.parse((event as MessageEvent).data)));
+    source.onerror = () => {
+      if (closed || !source || source.readyState !== EventSource.CLOSED) {
+        return;
+      }
+      // Jitter keeps dashboards refused together from all coming back at once
+      retryTimer = setTimeout(connect, REFUSED_RETRY_SECONDS * 1000 * (1 + Math.random()));
+    };
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    if (retryTimer) clearTimeout(retryTimer);
+    if (source) source.close();
+  };
+};